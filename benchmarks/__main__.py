@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+A small runner for the asv-style benchmarks in this package, so they can be run
+without installing asv:
+    python -m benchmarks --sizes 10,1000 --save before.json
+    python -m benchmarks --sizes 10,1000 --compare before.json
+Times are per call (the best and the median of --repeat runs); peak memory is
+the largest amount of memory python allocated during the call (tracemalloc).
+"""
+import argparse
+import importlib
+import itertools
+import json
+import re
+import sys
+import time
+import tracemalloc
+
+BENCHMARK_MODULES = ['benchmarks.bench_engine']
+
+
+def benchmark_classes(module_names):
+    for name in module_names:
+        module = importlib.import_module(name)
+        for class_name, cls in sorted(vars(module).items()):
+            if isinstance(cls, type) and cls.__module__ == module.__name__:
+                methods = [m for m in sorted(vars(cls)) if m.startswith(('time_', 'peakmem_'))]
+                if methods:
+                    yield cls, methods
+
+
+def parameter_sets(cls, sizes):
+    params = getattr(cls, 'params', [])
+    names = getattr(cls, 'param_names', [])
+    if sizes is not None and 'nodes' in names:
+        params = list(params)
+        params[names.index('nodes')] = sizes
+    return list(itertools.product(*params))
+
+
+def time_call(method, repeat, min_time=0.05):
+    # call method enough times that one measurement takes at least min_time
+    start = time.perf_counter()
+    method()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / once) if once > 0 else 1000)
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            method()
+        times.append((time.perf_counter() - start) / number)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times) // 2], 'unit': 's'}
+
+
+def peak_memory(method):
+    tracemalloc.start()
+    try:
+        method()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'min': peak, 'median': peak, 'unit': 'bytes'}
+
+
+def run_benchmarks(pattern=None, sizes=None, repeat=5, modules=BENCHMARK_MODULES):
+    # yields ("Class.method(params)", {"min", "median", "unit"}) for every benchmark
+    for cls, methods in benchmark_classes(modules):
+        for params in parameter_sets(cls, sizes):
+            keys = {m: cls.__name__ + '.' + m + '(' + ', '.join(str(p) for p in params) + ')' for m in methods}
+            wanted = [m for m in methods if pattern is None or re.search(pattern, keys[m])]
+            if not wanted:
+                continue
+            instance = cls()
+            if hasattr(instance, 'setup'):
+                instance.setup(*params)
+            try:
+                for m in wanted:
+                    method = getattr(instance, m)
+                    if m.startswith('time_'):
+                        yield keys[m], time_call(method, repeat)
+                    else:
+                        yield keys[m], peak_memory(method)
+            finally:
+                if hasattr(instance, 'teardown'):
+                    instance.teardown(*params)
+
+
+def format_result(result):
+    if result['unit'] == 'bytes':
+        return '%10.1f KiB' % (result['median'] / 1024)
+    return '%10.3f ms' % (result['median'] * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--filter', metavar='REGEX', help='only run benchmarks whose name matches')
+    parser.add_argument('--sizes', metavar='N,N,...', help='graph sizes to use instead of the defaults')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', metavar='FILE', help='write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='compare with results saved by --save')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='report a regression when a result is this many times the saved one')
+    args = parser.parse_args(argv)
+    sizes = [int(n) for n in args.sizes.split(',')] if args.sizes else None
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    results = {}
+    regressions = 0
+    for key, result in run_benchmarks(args.filter, sizes, args.repeat):
+        results[key] = result
+        line = '%-78s %s' % (key, format_result(result))
+        if key in previous and previous[key]['median'] > 0:
+            ratio = result['median'] / previous[key]['median']
+            line += '  %5.2fx' % ratio
+            if ratio > args.threshold:
+                line += '  REGRESSION'
+                regressions += 1
+        print(line)
+        sys.stdout.flush()
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
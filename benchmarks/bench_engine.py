@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the Node engine on synthetic graphs (see benchmarks.graphs), written
+in the style of asv: time_* methods are timed, peakmem_* methods report the peak
+memory they allocate, and setup() runs first for every combination of params.
+Run them with
+    python -m benchmarks
+"""
+import json
+import os
+import tempfile
+
+from pictograph.Graph import Graph
+from pictograph.Node import LAZY_MODE, get_evaluation_mode, insert_edge, invalidate_downstream, set_evaluation_mode
+from pictograph.customNodes import AdditionNode, MultiplicationNode, NumberNode
+
+from benchmarks.graphs import SHAPES, make_graph, middle_node, sources
+
+SIZES = [10, 1000, 100000]
+
+
+class Propagation(object):
+    params = [SHAPES, SIZES]
+    param_names = ['shape', 'nodes']
+
+    def setup(self, shape, n):
+        self.graph = make_graph(shape, n)
+        self.graph.run()
+        self.sources = [self.graph.nodes[i] for i in sources(self.graph)]
+        self.source = self.graph.nodes[sources(self.graph)[0]]
+        self.value = 1.0
+
+    def time_full_run(self):
+        # everything stale, evaluated from the sources down
+        invalidate_downstream(self.sources)
+        self.graph.run()
+
+    def time_parameter_change(self):
+        # what a user waits for after editing the first source in the GUI
+        self.value = -self.value
+        self.source._adjust_parameter("Number", self.value)
+
+
+class LazyPropagation(object):
+    params = [SHAPES, SIZES]
+    param_names = ['shape', 'nodes']
+
+    def setup(self, shape, n):
+        self.mode = get_evaluation_mode()
+        set_evaluation_mode(LAZY_MODE)
+        self.graph = make_graph(shape, n)
+        self.graph.run()
+        self.source = self.graph.nodes[sources(self.graph)[0]]
+        self.sink = self.graph.sinks()[-1]
+        self.value = 1.0
+
+    def teardown(self, shape, n):
+        set_evaluation_mode(self.mode)
+
+    def time_parameter_change_then_evaluate_sink(self):
+        self.value = -self.value
+        self.source._adjust_parameter("Number", self.value)
+        self.graph.evaluate([self.sink])
+
+
+class ArrayPropagation(object):
+    # a chain of array arithmetic fed by one scalar: every change recomputes
+    # arrays of the same shape, which should reuse the old ones
+    params = [[10, 100], [1000, 1000000]]
+    param_names = ['chain', 'length']
+
+    def setup(self, n, length):
+        from pictograph.NumpyNodes import OnesNode
+        self.graph = Graph()
+        ones = self.graph.add_node(OnesNode())
+        self.graph.set_parameter(ones, "Length", length)
+        number = self.graph.add_node(NumberNode(1.0))
+        previous = ones
+        for i in range(n):
+            node = self.graph.add_node(MultiplicationNode() if i % 2 else AdditionNode())
+            self.graph.connect(previous, node, "arg1")
+            self.graph.connect(number, node, "arg2")
+            previous = node
+        self.graph.run()
+        self.source = self.graph.nodes[number]
+        self.value = 1.0
+
+    def time_parameter_change(self):
+        self.value = -self.value
+        self.source._adjust_parameter("Number", self.value)
+
+    def peakmem_parameter_change(self):
+        self.time_parameter_change()
+
+
+class Connections(object):
+    params = [SHAPES, SIZES]
+    param_names = ['shape', 'nodes']
+
+    def setup(self, shape, n):
+        self.graph = make_graph(shape, n)
+        self.graph.run()
+        self.node = self.graph.nodes[middle_node(self.graph)]
+        self.input_node = self.node._input_terminals["arg1"]
+
+    def time_disconnect_connect(self):
+        # disconnecting invalidates everything downstream of the node
+        self.node.disconnect_input("arg1")
+        self.node.connect_input("arg1", self.input_node)
+
+    def time_connect_new_node(self):
+        # the usual case: a new node is connected below an existing one
+        node = AdditionNode()
+        node.connect_input("arg1", self.node)
+        node.connect_input("arg2", self.input_node)
+        node.disconnect_input("arg1")
+        node.disconnect_input("arg2")
+
+    def time_reject_cycle(self):
+        # the check connect_input makes before connecting the node back into its
+        # own input; it has to search everything between the two
+        try:
+            insert_edge(self.node, self.input_node)
+        except ValueError:
+            pass
+
+
+class Serialization(object):
+    params = [SHAPES, SIZES]
+    param_names = ['shape', 'nodes']
+
+    def setup(self, shape, n):
+        self.graph = make_graph(shape, n)
+        self.text = json.dumps(self.graph.to_dict())
+        fd, self.filename = tempfile.mkstemp(suffix='.pictograph')
+        os.close(fd)
+        self.graph.save(self.filename)
+
+    def teardown(self, shape, n):
+        os.remove(self.filename)
+
+    def time_to_json(self):
+        json.dumps(self.graph.to_dict())
+
+    def time_from_json(self):
+        Graph.from_dict(json.loads(self.text))
+
+    def time_save(self):
+        self.graph.save(self.filename)
+
+    def time_load(self):
+        Graph.load(self.filename)
+
+
+class Memory(object):
+    params = [SHAPES, SIZES]
+    param_names = ['shape', 'nodes']
+
+    def setup(self, shape, n):
+        self.shape = shape
+        self.n = n
+
+    def peakmem_build(self):
+        make_graph(self.shape, self.n)
+
+    def peakmem_build_and_run(self):
+        make_graph(self.shape, self.n).run()
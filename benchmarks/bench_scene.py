@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Frame time of the scene while one glyph is dragged around, for scenes with many glyphs.
+Runs without a display:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_scene 1000 5000
+"""
+import sys
+import time
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+def make_window(n_glyphs):
+    from pictograph.pictograph import MainWindow, PictoGlyph
+    from pictograph import customNodes
+    mw = MainWindow()
+    mw.resize(1200, 800)
+    columns = int(n_glyphs ** 0.5) + 1
+    for i in range(n_glyphs):
+        pos = QtCore.QPointF(80 * (i % columns), 100 * (i // columns))
+        mw.scene.addItem(PictoGlyph(pos, customNodes.NumberNode))
+    return mw
+
+
+def frame_times(mw, frames=50):
+    # move one glyph, then paint the visible part of the scene, like a drag does
+    view = mw.view
+    image = QtGui.QImage(view.viewport().size(), QtGui.QImage.Format_ARGB32_Premultiplied)
+    glyph = next(iter(mw.scene.glyphs))
+    times = []
+    for i in range(frames):
+        glyph.setPos(glyph.pos() + QtCore.QPointF(1, 1))
+        start = time.perf_counter()
+        painter = QtGui.QPainter(image)
+        view.render(painter)
+        painter.end()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main(sizes):
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    for n in sizes:
+        mw = make_window(n)
+        for tiles in [False, True]:
+            mw.scene.cacheBackgroundTiles = tiles
+            times = sorted(frame_times(mw))
+            print('%6d glyphs, %-13s median %7.2f ms, worst %7.2f ms' % (
+                n, 'tiles' if tiles else 'vector grid', 1000 * times[len(times) // 2], 1000 * times[-1]))
+        mw.close()
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 5000])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic pictographs for the benchmarks. Every generator returns a Graph.Graph made
+of NumberNodes (the sources, whose "Number" parameter can be changed) and
+AdditionNodes, with about n nodes in total.
+"""
+import random
+
+from pictograph.Graph import Graph
+from pictograph.customNodes import AdditionNode, NumberNode
+
+SHAPES = ['chain', 'fan_out', 'diamonds', 'random_dag']
+
+
+def _add(graph, arg1, arg2):
+    node_id = graph.add_node(AdditionNode())
+    graph.connect(arg1, node_id, "arg1")
+    graph.connect(arg2, node_id, "arg2")
+    return node_id
+
+
+def chain(n):
+    # source -> add -> add -> ..., every add also reading a shared constant
+    graph = Graph()
+    previous = graph.add_node(NumberNode(1.0))
+    constant = graph.add_node(NumberNode(1.0))
+    for i in range(n - 2):
+        previous = _add(graph, previous, constant)
+    return graph
+
+
+def fan_out(n):
+    # one source read by every other node
+    graph = Graph()
+    source = graph.add_node(NumberNode(1.0))
+    for i in range(n - 1):
+        _add(graph, source, source)
+    return graph
+
+
+def diamonds(n):
+    # a -> (b, c) -> d -> (e, f) -> g ...: every value is used twice, and every
+    # node is reached along two paths
+    graph = Graph()
+    top = graph.add_node(NumberNode(1.0))
+    constant = graph.add_node(NumberNode(1.0))
+    for i in range((n - 2) // 3):
+        left = _add(graph, top, constant)
+        right = _add(graph, top, constant)
+        top = _add(graph, left, right)
+    return graph
+
+
+def random_dag(n, seed=0, sources=0.1, window=100):
+    # a tenth of the nodes are sources; every add reads two random nodes among the
+    # previous window nodes, so that changing a source dirties part of the graph
+    rng = random.Random(seed)
+    graph = Graph()
+    ids = [graph.add_node(NumberNode(1.0)), graph.add_node(NumberNode(1.0))]
+    while len(ids) < n:
+        if rng.random() < sources:
+            ids.append(graph.add_node(NumberNode(1.0)))
+        else:
+            recent = ids[-window:]
+            ids.append(_add(graph, rng.choice(recent), rng.choice(recent)))
+    return graph
+
+
+def make_graph(shape, n):
+    return {'chain': chain, 'fan_out': fan_out, 'diamonds': diamonds, 'random_dag': random_dag}[shape](n)
+
+
+def sources(graph):
+    return [node_id for node_id, node in graph.nodes.items() if isinstance(node, NumberNode)]
+
+
+def middle_node(graph):
+    # an AdditionNode about halfway down the topological order
+    adds = [node_id for node_id, node in graph.nodes.items() if isinstance(node, AdditionNode)]
+    return adds[len(adds) // 2]
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+A binary container for pictographs that can hold numpy arrays: parameters that are
+arrays, and optionally the cached outputs of nodes.
+
+The file is a zip archive. "graph.json" holds the usual glyphs/connections dict, in
+which every array is replaced by {"__array__": <member name>}. The arrays are stored
+uncompressed as .npy members, so that they can be memory-mapped straight out of the
+archive when it is opened.
+"""
+import json
+import struct
+import zipfile
+
+import numpy as np
+
+ARCHIVE_EXTENSION = '.pictographz'
+GRAPH_MEMBER = 'graph.json'
+
+
+def is_archive(filename):
+    return zipfile.is_zipfile(filename)
+
+
+def _write_array(zf, name, value):
+    with zf.open(name, 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asanyarray(value), allow_pickle=False)
+
+
+def save_archive(filename, the_dict, outputs=None):
+    # outputs: optional {glyph id: (fingerprint, array)} of cached results to embed
+    glyphs = []
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for g in the_dict['glyphs']:
+            g = dict(g)
+            parameters = dict(g.get('adjustable_parameters', {}))
+            for key, value in parameters.items():
+                if isinstance(value, np.ndarray):
+                    name = 'arrays/' + str(g['id']) + '/' + key + '.npy'
+                    _write_array(zf, name, value)
+                    parameters[key] = {'__array__': name}
+            g['adjustable_parameters'] = parameters
+            glyphs.append(g)
+        saved_outputs = []
+        for node_id, (fingerprint, value) in (outputs or {}).items():
+            name = 'outputs/' + str(node_id) + '.npy'
+            _write_array(zf, name, value)
+            saved_outputs.append({'id': node_id, 'fingerprint': fingerprint, '__array__': name})
+        graph = dict(the_dict, glyphs=glyphs)
+        if saved_outputs:
+            graph['outputs'] = saved_outputs
+        zf.writestr(GRAPH_MEMBER, json.dumps(graph, separators=(',', ':')),
+                    compress_type=zipfile.ZIP_DEFLATED)
+
+
+def _read_array(zf, f, name, mmap):
+    # memory-map the .npy member in place; fall back to reading it into memory
+    # (e.g. for empty arrays, which cannot be mapped)
+    info = zf.getinfo(name)
+    if mmap and info.compress_type == zipfile.ZIP_STORED:
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if not dtype.hasobject and int(np.prod(shape)) > 0:
+            return np.memmap(f.name, dtype=dtype, mode='r', shape=shape,
+                             order='F' if fortran_order else 'C', offset=f.tell())
+    with zf.open(name) as member:
+        return np.lib.format.read_array(member, allow_pickle=False)
+
+
+def load_archive(filename, mmap=True):
+    # returns the glyphs/connections dict with arrays put back in place, and
+    # {glyph id: (fingerprint, array)} for the cached outputs
+    with open(filename, 'rb') as f, zipfile.ZipFile(f) as zf:
+        d = json.loads(zf.read(GRAPH_MEMBER).decode('utf-8'))
+        for g in d['glyphs']:
+            for key, value in g.get('adjustable_parameters', {}).items():
+                if isinstance(value, dict) and '__array__' in value:
+                    g['adjustable_parameters'][key] = _read_array(zf, f, value['__array__'], mmap)
+        outputs = {}
+        for o in d.pop('outputs', []):
+            outputs[o['id']] = (o['fingerprint'], _read_array(zf, f, o['__array__'], mmap))
+    return d, outputs
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Caches for node outputs, keyed by the fingerprint of the node that made them
+(see Node._compute_fingerprint and Node.set_memo_cache)
+"""
+from collections import OrderedDict
+import os
+import pickle
+import sys
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def size_of(value):
+    # numpy arrays (and anything else with nbytes) report their data size
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(value)
+
+
+class MemoCache(object):
+    def __init__(self, max_entries=None, max_bytes=None):
+        # None means unlimited
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size), least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        # returns (found, value)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    def put(self, key, value):
+        size = size_of(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.total_bytes > self.max_bytes)):
+            key, (value, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._entries), 'bytes': self.total_bytes}
+
+
+class DiskCache(object):
+    # Keeps outputs in a directory so that they survive between sessions. Numeric
+    # numpy arrays are stored as .npy files and memory-mapped (read-only) when read
+    # back; everything else is pickled. File modification times record use, and the
+    # least recently used files are deleted once max_bytes is exceeded.
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy') or name.endswith('.pkl'):
+                yield os.path.join(self.directory, name)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key, '.npy')) or os.path.exists(self._path(key, '.pkl'))
+
+    def get(self, key):
+        # returns (found, value)
+        try:
+            if os.path.exists(self._path(key, '.npy')):
+                path = self._path(key, '.npy')
+                value = np.load(path, mmap_mode='r')
+            else:
+                path = self._path(key, '.pkl')
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+        os.utime(path)
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        is_array = np is not None and isinstance(value, np.ndarray) and not value.dtype.hasobject
+        path = self._path(key, '.npy' if is_array else '.pkl')
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        # write to a temporary file first, so a crash never leaves half a result behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if is_array:
+                    np.save(f, value, allow_pickle=False)
+                else:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            os.remove(tmp_path)
+            return
+        self.total_bytes += os.path.getsize(path)
+        self._evict()
+
+    def _evict(self):
+        if self.max_bytes is None or self.total_bytes <= self.max_bytes:
+            return
+        for path in sorted(self._files(), key=os.path.getmtime):
+            if self.total_bytes <= self.max_bytes:
+                break
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        for path in list(self._files()):
+            os.remove(path)
+        self.total_bytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(list(self._files())), 'bytes': self.total_bytes}
+
+
+class TieredCache(object):
+    # Looks in each cache in turn (e.g. a MemoCache in front of a DiskCache), copies
+    # what it finds into the faster caches, and stores new results in all of them
+    def __init__(self, *caches):
+        self.caches = caches
+
+    def get(self, key):
+        for i, cache in enumerate(self.caches):
+            found, value = cache.get(key)
+            if found:
+                for faster in self.caches[:i]:
+                    faster.put(key, value)
+                return True, value
+        return False, None
+
+    def put(self, key, value):
+        for cache in self.caches:
+            cache.put(key, value)
+
+    def stats(self):
+        return [cache.stats() for cache in self.caches]
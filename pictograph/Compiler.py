@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Fuse chains of elementwise nodes (add, subtract, multiply, ...) into one kernel.
+
+Evaluated node by node, (a + b) * c - d makes a new temporary array at every node.
+compile_nodes() finds the elementwise nodes whose only consumer is another
+elementwise node and folds them into the consumer, which then evaluates the whole
+expression at once: with numexpr when it is installed, otherwise with ufuncs that
+write into a few reused buffers (out=). Nodes of any other type run as usual.
+
+The nodes folded into a kernel are not computed on their own; their outputs stay
+invalid until something evaluates them directly (e.g. Node.evaluate).
+"""
+import operator
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+from pictograph.Node import topological_order, get_profiler
+from pictograph.Streaming import is_stream, elementwise
+
+# name of the operation (Node._elementwise_op) -> (python function, ufunc name, numexpr operator)
+ELEMENTWISE_OPS = {
+    'add': (operator.add, 'add', '+'),
+    'subtract': (operator.sub, 'subtract', '-'),
+    'multiply': (operator.mul, 'multiply', '*'),
+}
+
+# Longest chain of nodes fused into one kernel. Kernels are built and evaluated
+# recursively, so longer chains are split into several kernels
+MAX_FUSED_DEPTH = 64
+
+# dtypes that numexpr computes exactly like numpy
+_NUMEXPR_KINDS = 'fc'
+_NUMEXPR_INTEGERS = ('int32', 'int64')
+
+
+# class -> its operation, or None if it can't be fused
+_class_ops = {}
+
+
+def _class_op(cls):
+    # A class computes its _elementwise_op only if it uses the methods of the class
+    # that declared it: a subclass that overrides them computes something else
+    op = getattr(cls, '_elementwise_op', None)
+    if op not in ELEMENTWISE_OPS:
+        return None
+    declaring = next(c for c in cls.__mro__ if '_elementwise_op' in c.__dict__)
+    for name in ('_process_core', '_process_stream'):
+        if getattr(cls, name, None) is not getattr(declaring, name, None):
+            return None
+    return op
+
+
+def elementwise_op(node):
+    cls = type(node)
+    try:
+        return _class_ops[cls]
+    except KeyError:
+        op = _class_ops[cls] = _class_op(cls)
+        return op
+
+
+class FusedKernel(object):
+    # An expression tree that stands in for root and the interior nodes feeding it.
+    # The tree is nested (op, [arguments]) tuples; an argument that is an integer is
+    # the index of a leaf, a node outside the kernel whose output is an operand.
+    def __init__(self, root, interior, leaves, tree):
+        self.root = root
+        self.interior = interior
+        self.leaves = leaves
+        self.tree = tree
+
+    def __repr__(self):
+        return 'FusedKernel(' + self.expression() + ')'
+
+    def expression(self, names=None):
+        if names is None:
+            names = ['v' + str(i) for i in range(len(self.leaves))]
+
+        def text(t):
+            if isinstance(t, int):
+                return names[t]
+            op, args = t
+            return '(' + (' ' + ELEMENTWISE_OPS[op][2] + ' ').join(text(a) for a in args) + ')'
+        return text(self.tree)
+
+    def _process_self(self):
+        # same contract as Node._process_self, for the root of the kernel
+        for node in self.interior:
+            node._clear_output()
+        if not all(leaf._is_output_valid for leaf in self.leaves):
+            return False
+        key, found, value = self.root._memo_lookup()
+        if not found:
+            profiler = get_profiler()
+            start = time.perf_counter()
+            value = self(*[leaf._output_data_cache for leaf in self.leaves])
+            if profiler is not None:
+                profiler.record(self.root, start, time.perf_counter(), value)
+        self.root._store_output(value, None if found else key)
+        return True
+
+    def __call__(self, *values):
+        streams = [v for v in values if is_stream(v)]
+        if streams:
+            return elementwise(self._evaluate, *values)
+        # whole arrays can go into the root's reused output (see Node._output_buffer)
+        return self._evaluate(*values, buffer=self.root._output_buffer if self.root._reuse_output else None)
+
+    def _evaluate(self, *values, buffer=None):
+        if np is None or not any(isinstance(v, np.ndarray) for v in values):
+            return self._evaluate_python(values)
+        if not all(_is_numeric(v) for v in values):
+            return self._evaluate_python(values)
+        if numexpr is not None and all(_numexpr_can_compute(v) for v in values):
+            names = ['v' + str(i) for i in range(len(values))]
+            return numexpr.evaluate(self.expression(names), local_dict=dict(zip(names, values)))
+        return self._evaluate_ufuncs(values, buffer)
+
+    def _evaluate_python(self, values):
+        def run(t):
+            if isinstance(t, int):
+                return values[t]
+            op, args = t
+            function = ELEMENTWISE_OPS[op][0]
+            result = run(args[0])
+            for a in args[1:]:
+                result = function(result, run(a))
+            return result
+        return run(self.tree)
+
+    def _evaluate_ufuncs(self, values, buffer=None):
+        # Every operation writes into a temporary of its result's shape and dtype.
+        # Temporaries that are no longer needed go back to a pool, so the number
+        # of arrays allocated is the number that are alive at the same time. The
+        # last operation writes into buffer(shape, dtype) instead, if given.
+        free = {}
+
+        def release(array):
+            free.setdefault((array.shape, array.dtype), []).append(array)
+
+        def run(t, last=False):
+            # returns (value, whether it is a temporary owned by this kernel)
+            if isinstance(t, int):
+                return values[t], False
+            op, args = t
+            results = [run(a) for a in args]
+            ufunc = getattr(np, ELEMENTWISE_OPS[op][1])
+            result, owned = results[0]
+            for i, (value, value_owned) in enumerate(results[1:], 2):
+                dtype = np.result_type(result, value)
+                shape = np.broadcast_shapes(np.shape(result), np.shape(value))
+                # scalar results stay scalars rather than 0-d arrays
+                final = last and i == len(results) and buffer is not None and shape != ()
+                out = None
+                # writing over an input is safe for elementwise ufuncs
+                for candidate, candidate_owned in [(result, owned), (value, value_owned)]:
+                    if not candidate_owned:
+                        continue
+                    if out is None and not final and candidate.shape == shape and candidate.dtype == dtype:
+                        out = candidate
+                    else:
+                        release(candidate)
+                if final:
+                    out = buffer(shape, dtype)
+                elif out is None:
+                    pool = free.get((shape, dtype))
+                    out = pool.pop() if pool else np.empty(shape, dtype)
+                ufunc(result, value, out=out)
+                result, owned = out, True
+            return result, owned
+        return run(self.tree, last=True)[0]
+
+
+def _is_numeric(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in 'biufc'
+    return isinstance(value, (int, float, complex, np.number))
+
+
+def _numexpr_can_compute(value):
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in _NUMEXPR_KINDS or value.dtype.name in _NUMEXPR_INTEGERS
+    return isinstance(value, (float, complex, np.floating, np.complexfloating))
+
+
+def compile_nodes(nodes):
+    # Returns the steps that evaluate nodes, in order: nodes, and FusedKernels that
+    # replace an elementwise node together with the elementwise nodes in nodes
+    # that feed only into it.
+    order = topological_order(nodes)
+    in_set = set(order)
+
+    def fusible(node):
+        if node not in in_set or elementwise_op(node) is None or not node._inputs_are_defined():
+            return False
+        if len(node._output_terminals) != 1:
+            return False
+        consumer = next(iter(node._output_terminals))
+        return (consumer in in_set and elementwise_op(consumer) is not None
+                and consumer._inputs_are_defined()
+                and list(consumer._input_terminals.values()).count(node) == 1)
+
+    folded = set()
+    depth = {}
+    for node in order:
+        if fusible(node):
+            d = 1 + max((depth[i] for i in node._input_terminals.values() if i in folded), default=0)
+            if d < MAX_FUSED_DEPTH:
+                folded.add(node)
+                depth[node] = d
+    steps = []
+    for node in order:
+        if node in folded:
+            continue
+        if (elementwise_op(node) is None or not node._inputs_are_defined()
+                or not any(i in folded for i in node._input_terminals.values())):
+            steps.append(node)
+            continue
+        interior = []
+        leaves = []
+
+        def build(n):
+            if n is not node and n not in folded:
+                if n not in leaves:
+                    leaves.append(n)
+                return leaves.index(n)
+            if n is not node:
+                interior.append(n)
+            return elementwise_op(n), [build(i) for i in n._input_terminals.values()]
+        steps.append(FusedKernel(node, interior, leaves, build(node)))
+    return steps
+
+
+def process_nodes_compiled(nodes, roots=None):
+    # a drop-in replacement for Node.process_nodes, e.g. for Node.set_process_handler.
+    # Every node is recomputed: roots are accepted, but there is no early cutoff
+    for step in compile_nodes(nodes):
+        step._process_self()
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+A GUI-free model of a pictograph: the nodes, their connections, and the code to
+load, save, and evaluate them without Qt
+"""
+from concurrent.futures import ProcessPoolExecutor
+import json
+import zipfile
+
+from pictograph.Node import (node_error, process_nodes, process_nodes_async, process_downstream,
+                             stale_upstream_nodes, invalidate_downstream, topological_order, same_value, batch)
+from pictograph.Compiler import process_nodes_compiled
+from pictograph.Parallel import make_executor, process_nodes_parallel
+from pictograph.Registry import node_registry
+
+
+def find_node_class(module_name, class_name):
+    return node_registry.find(module_name, class_name)
+
+
+def node_module_name(node):
+    name = node.__class__.__module__
+    if name.startswith('pictograph.'):
+        name = name[len('pictograph.'):]
+    return name
+
+
+def parse_parameter(parameter, text):
+    # convert a command line (or text box) string to the type an AdjustableParameter
+    # expects; raises ValueError when the text doesn't fit
+    if parameter.type == "int":
+        return int(text)
+    if parameter.type == "double":
+        return float(text)
+    if parameter.type == "options":
+        if text not in parameter.values:
+            node_error('"' + text + '" is not one of ' + ', '.join(parameter.values))
+        return text
+    if parameter.type == "ints":
+        # e.g. a shape, "3, 4"
+        return tuple(int(v) for v in text.replace(',', ' ').split())
+    if parameter.type == "Vector":
+        import numpy as np
+        return np.array([float(v) for v in text.replace(',', ' ').split()])
+    return text
+
+
+def format_parameter(parameter):
+    # the text that parse_parameter turns back into the parameter's value
+    if parameter.type in ["ints", "Vector"]:
+        return ', '.join(str(v) for v in parameter._value)
+    return str(parameter._value)
+
+
+class ItemIndex(object):
+    # An insertion-ordered collection with O(1) append, remove, membership and id
+    # lookup. Every item gets an integer id that stays the same until it is removed.
+    def __init__(self, items=()):
+        self._ids = {}    # item -> id
+        self._items = {}  # id -> item
+        self._next_id = 0
+        for item in items:
+            self.append(item)
+
+    def append(self, item):
+        if item in self._ids:
+            return self._ids[item]
+        item_id = self._next_id
+        self._next_id += 1
+        self._ids[item] = item_id
+        self._items[item_id] = item
+        return item_id
+
+    def remove(self, item):
+        if item not in self._ids:
+            raise ValueError('item is not in the index')
+        self.discard(item)
+
+    def discard(self, item):
+        item_id = self._ids.pop(item, None)
+        if item_id is not None:
+            del self._items[item_id]
+
+    def id_of(self, item):
+        return self._ids[item]
+
+    def item(self, item_id):
+        return self._items[item_id]
+
+    def copy(self):
+        return ItemIndex(self)
+
+    def __contains__(self, item):
+        return item in self._ids
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+
+def restore_outputs(nodes, outputs):
+    # nodes is {node id: Node}, outputs {node id: (fingerprint, value)}. Outputs are
+    # only used when the node would still compute the same thing, i.e. when the
+    # fingerprints match. Returns the nodes whose outputs were restored
+    restored = []
+    ids = {node: node_id for node_id, node in nodes.items()}
+    for node in topological_order(nodes.values()):
+        node_id = ids[node]
+        if node_id in outputs and node._memoize and node._inputs_are_valid():
+            fingerprint, value = outputs[node_id]
+            if node._compute_fingerprint() == fingerprint:
+                node._store_output(value)
+                node._output_fingerprint = fingerprint
+                restored.append(node)
+    return restored
+
+
+def saved_outputs(nodes):
+    # the outputs of nodes ({node id: Node}) worth embedding in an archive: valid
+    # numpy arrays of nodes whose output follows from their parameters and inputs
+    outputs = {}
+    for node_id, node in nodes.items():
+        value = node._output_data_cache
+        if node.is_output_valid() and node._memoize and hasattr(value, 'dtype') and hasattr(value, 'shape'):
+            outputs[node_id] = (node._compute_fingerprint(), value)
+    return outputs
+
+
+def _sweep_chunk(graph_dict, node_ids, assignments):
+    # runs in a worker process
+    return list(Graph.from_dict(graph_dict).sweep(assignments, node_ids, restore=False))
+
+
+class Graph(object):
+    def __init__(self):
+        # glyph id -> Node, and back
+        self.nodes = {}
+        self.node_ids = {}
+        # each connection is a dict with startGlyph, endGlyph and endGlyphKey
+        self.connections = []
+        # glyph id -> extra information from the file (e.g. Position), kept for saving
+        self.glyph_data = {}
+        # one more than the largest id so far, for nodes added without an id
+        self._next_id = 0
+
+    def add_node(self, node, node_id=None, glyph_data=None):
+        if node_id is None:
+            node_id = self._next_id
+        if node_id in self.nodes:
+            node_error('A node with id ' + str(node_id) + ' is already in the graph')
+        self._next_id = max(self._next_id, node_id + 1)
+        self.nodes[node_id] = node
+        self.node_ids[node] = node_id
+        self.glyph_data[node_id] = glyph_data or {}
+        return node_id
+
+    def connect(self, start_id, end_id, key):
+        self.nodes[end_id].connect_input(key, self.nodes[start_id])
+        self.connections.append({'startGlyph': start_id, 'endGlyph': end_id, 'endGlyphKey': key})
+
+    def batch(self):
+        # with graph.batch(): ... makes edits without invalidating or evaluating
+        # anything until the block ends (see Node.batch)
+        return batch()
+
+    def set_parameter(self, node_id, key, value):
+        # change a parameter and mark what depends on it stale, without processing;
+        # call run() afterwards
+        self.parameter(node_id, key)._value = value
+        invalidate_downstream([self.nodes[node_id]])
+
+    def set_parameter_from_string(self, node_id, key, text):
+        parameter = self.parameter(node_id, key)
+        self.set_parameter(node_id, key, parse_parameter(parameter, text))
+
+    def run(self, executor=None, max_workers=None, compile=False):
+        # evaluate every stale node once, sources first. executor can be "thread",
+        # "process" or a concurrent.futures executor, to evaluate independent
+        # branches in parallel. compile fuses chains of elementwise nodes (see
+        # Compiler); the nodes inside a chain are left without an output
+        nodes = stale_upstream_nodes(self.nodes.values())
+        if compile:
+            if executor is not None:
+                node_error('A compiled graph cannot be run on an executor')
+            process_nodes_compiled(nodes)
+        elif executor is None:
+            process_nodes(nodes)
+        elif isinstance(executor, str):
+            with make_executor(executor, max_workers) as pool:
+                process_nodes_parallel(nodes, pool)
+        else:
+            process_nodes_parallel(nodes, executor)
+
+    async def run_async(self):
+        # run() for code that already has an event loop running (run() starts one
+        # of its own when the graph has async nodes)
+        await process_nodes_async(stale_upstream_nodes(self.nodes.values()))
+
+    def evaluate(self, node_ids):
+        # compute only what the given nodes need (see Node.evaluate) and return their outputs
+        evaluate_nodes = stale_upstream_nodes([self.nodes[i] for i in node_ids])
+        process_nodes(evaluate_nodes)
+        return self.outputs(node_ids)
+
+    def sweep(self, assignments, node_ids=None, processes=None, chunksize=None, restore=True):
+        # Evaluate the graph once per assignment and yield {node id: output} for
+        # node_ids (the sinks by default). Each assignment maps (node id, parameter
+        # name) to a value, applied on top of the parameters the graph started with.
+        # Only the nodes downstream of parameters that differ from the previous run
+        # are recomputed. With processes, runs are split into chunks of consecutive
+        # assignments that are evaluated in worker processes. Afterwards (also when
+        # the sweep is stopped early) the graph is back to its own parameters, unless
+        # restore is False, e.g. for a graph that is thrown away after the sweep.
+        if node_ids is None:
+            node_ids = self.sinks()
+        if processes:
+            yield from self._sweep_in_processes(assignments, node_ids, processes, chunksize)
+            return
+        base = {}
+        first = True
+        try:
+            for assignment in assignments:
+                for target in assignment:
+                    if target not in base:
+                        base[target] = self.parameter(*target)._value
+                wanted = dict(base)
+                wanted.update(assignment)
+                changed = []
+                for (node_id, key), value in wanted.items():
+                    parameter = self.parameter(node_id, key)
+                    if first or not same_value(parameter._value, value):
+                        parameter._value = value
+                        changed.append(self.nodes[node_id])
+                if first:
+                    process_nodes(self.nodes.values())
+                    first = False
+                elif changed:
+                    process_downstream(changed)
+                yield self.outputs(node_ids)
+        finally:
+            # put the parameters back, and the outputs with them
+            if restore:
+                self._restore_parameters(base, processed=not first)
+
+    def _restore_parameters(self, values, processed):
+        # {(node id, parameter name): value}; processed re-runs what depends on the
+        # parameters that change, otherwise it is only invalidated
+        changed = []
+        for (node_id, key), value in values.items():
+            parameter = self.parameter(node_id, key)
+            if not same_value(parameter._value, value):
+                parameter._value = value
+                changed.append(self.nodes[node_id])
+        if changed and processed:
+            process_downstream(changed)
+        elif changed:
+            invalidate_downstream(changed)
+
+    def _sweep_in_processes(self, assignments, node_ids, processes, chunksize):
+        assignments = list(assignments)
+        if chunksize is None:
+            chunksize = max(1, -(-len(assignments) // processes))
+        chunks = [assignments[i:i + chunksize] for i in range(0, len(assignments), chunksize)]
+        graph_dict = self.to_dict()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for results in executor.map(_sweep_chunk, [graph_dict] * len(chunks),
+                                        [node_ids] * len(chunks), chunks):
+                yield from results
+
+    def parameter(self, node_id, key):
+        parameters = self.nodes[node_id]._adjustable_parameters
+        if key not in parameters:
+            node_error('The node ' + str(node_id) + ' has no adjustable parameter "' + key + '"')
+        return parameters[key]
+
+    def node_labels(self):
+        # node -> "<id>.<class>", e.g. to name the nodes in a Profiler report
+        return {node: str(node_id) + '.' + node.__class__.__name__ for node_id, node in self.nodes.items()}
+
+    def sinks(self):
+        # ids of nodes whose output is not connected to anything
+        return [i for i, node in self.nodes.items() if not node._output_terminals]
+
+    def outputs(self, node_ids=None):
+        if node_ids is None:
+            node_ids = self.sinks()
+        return {i: self.nodes[i]._output_data_cache for i in node_ids}
+
+    # -------- File format ---------
+    @classmethod
+    def from_dict(cls, d):
+        if 'glyphs' not in d or 'connections' not in d:
+            node_error('A pictograph needs both "glyphs" and "connections"')
+        graph = cls()
+        with graph.batch():
+            for g in d['glyphs']:
+                node = find_node_class(g['node_module'], g['node_class'])()
+                extra = {k: v for k, v in g.items()
+                         if k not in ['id', 'node_class', 'node_module', 'adjustable_parameters']}
+                node_id = graph.add_node(node, g['id'], extra)
+                for k, v in g.get('adjustable_parameters', {}).items():
+                    graph.set_parameter(node_id, k, v)
+            for c in d['connections']:
+                graph.connect(c['startGlyph'], c['endGlyph'], c['endGlyphKey'])
+        return graph
+
+    @classmethod
+    def load(cls, filename):
+        # .pictograph (json) files, or binary archives (see pictograph.Archive)
+        if zipfile.is_zipfile(filename):
+            from pictograph.Archive import load_archive
+            d, outputs = load_archive(filename)
+            graph = cls.from_dict(d)
+            graph.restore_outputs(outputs)
+            return graph
+        with open(filename, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def restore_outputs(self, outputs):
+        # {node id: (fingerprint, value)}, see restore_outputs
+        restore_outputs(self.nodes, outputs)
+
+    def saved_outputs(self):
+        return saved_outputs(self.nodes)
+
+    def to_dict(self):
+        glyph_list = []
+        for i, node in self.nodes.items():
+            d = dict(self.glyph_data[i])
+            d.update(node._as_dictionary())
+            d['node_module'] = node_module_name(node)
+            d['id'] = i
+            glyph_list.append(d)
+        connection_list = []
+        for i, c in enumerate(self.connections):
+            d = dict(c)
+            d['id'] = i
+            connection_list.append(d)
+        return {'glyphs': glyph_list, 'connections': connection_list}
+
+    def save(self, filename, include_outputs=False):
+        # files ending in .pictographz are written as binary archives, which can hold
+        # array parameters and (with include_outputs) the cached array outputs
+        if filename.endswith('.pictographz'):
+            from pictograph.Archive import save_archive
+            save_archive(filename, self.to_dict(), self.saved_outputs() if include_outputs else None)
+            return
+        with open(filename, 'w') as f:
+            print(json.dumps(self.to_dict(), sort_keys=True, indent=4), file=f)
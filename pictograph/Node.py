@@ -3,50 +3,199 @@
 A node/glyph, which is the basic processing unit in a pictograph/flowchart/canvas
 """
 from abc import ABC, abstractmethod
+import asyncio
+from contextlib import contextmanager
+import copy
+import hashlib
+import inspect
+import itertools
+import operator
 import json
+import math
+import time
+import weakref
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pictograph.Streaming import is_stream, collect
+
+# How a change propagates through the graph.
+#   "scheduled": the dirty subgraph is ordered topologically and every affected
+#                node runs its _process_core exactly once per change
+#   "lazy":      changes only mark downstream nodes stale; nodes are computed when
+#                their value is requested (Node.evaluate), or when they are sinks
+#                (nodes without output, e.g. printers)
+#   "observer":  the original recursive message passing, kept for compatibility
+SCHEDULED_MODE = "scheduled"
+LAZY_MODE = "lazy"
+OBSERVER_MODE = "observer"
+_evaluation_mode = SCHEDULED_MODE
+
+# Optional cache shared by all nodes (see Cache.MemoCache and set_memo_cache)
+_memo_cache = None
+
+# Optional replacement for process_nodes, called with the nodes that need to be
+# evaluated, e.g. to evaluate on a worker thread (see set_process_handler)
+_process_handler = None
+
+# How a node decides that a recomputed output is the same as before, in which case
+# the nodes downstream keep their results (early cutoff). See Node._cutoff
+#   "none":        never; every change propagates
+#   "identity":    the new output is the very same object
+#   "equality":    ==, with arrays compared element by element (up to
+#                  MAX_COMPARED_BYTES; larger arrays always count as changed)
+#   "fingerprint": the same type and bytes (see value_fingerprint), e.g. for
+#                  arrays that contain NaNs, or objects without a useful ==
+NO_CUTOFF = "none"
+IDENTITY_CUTOFF = "identity"
+EQUALITY_CUTOFF = "equality"
+FINGERPRINT_CUTOFF = "fingerprint"
+
+# Comparing a large array costs a pass over both, and keeping the old one until the
+# new one is made doubles the memory the node needs
+MAX_COMPARED_BYTES = 1 << 20
+
+# The Batch that is open, if any (see batch)
+_batch = None
+
+# Every node gets a position in one global topological order (Node._order), which
+# connect_input keeps up to date; new nodes go at the end
+_order_counter = itertools.count()
+_order_of = operator.attrgetter('_order')
+
+# True once a node class with an async _process_core has been defined, so that
+# graphs without any can skip looking for them
+_have_async_nodes = False
+
+# Optional Profiler.Profiler that is told about every _process_core call and memo
+# cache hit (see set_profiler). Nothing is measured while it is None
+_profiler = None
 
 
 class AdjustableParameter(object):
-    def __init__(self, name, type, val):
+    __slots__ = ('name', 'type', 'default', 'values', '_value')
+
+    def __init__(self, name, type, val, values=()):
         self.name = name
         self.type = type
         self.default = None
-        self.values = []     # this is only used for type "options"
+        self.values = values     # the choices, for type "options"
         self._value = val
 
     def _as_dictionary(self):
-        return self.__dict__
+        return {key: getattr(self, key) for key in self.__slots__}
+
 
-    def __setattr__(self, key, value):
-        super().__setattr__(key, value)
+class InputValue(object):
+    # A class attribute that reads the input key of a node through its terminals
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __get__(self, node, owner):
+        if node is None:
+            return self
+        overrides = node._input_overrides
+        if overrides is not None and self.key in overrides:
+            return overrides[self.key]
+        try:
+            input_node = node._input_terminals[self.key]
+        except KeyError:
+            raise AttributeError("'" + owner.__name__ + "' object has no attribute '" + self.key + "'") from None
+        return None if input_node is None else input_node._output_data_cache
 
 
 class Node(ABC):
+    # Nodes are small and a graph can hold a great many of them, so they have no
+    # __dict__. Subclasses should declare __slots__ too (usually empty), and keep
+    # what is the same for every node of the class in class attributes.
+    __slots__ = ('_input_terminals', '_output_terminals', '_output_data_cache', '_is_output_valid',
+                 '_auto_process', '_adjustable_parameters', '_output_fingerprint', '_input_overrides',
+                 '_order', '_owned_buffer', '_buffer_view', '__weakref__')
+
     output_now_valid_message = 0
     output_now_invalid_message = 1
-    
+
+    # shown in the GUI
+    displayName = ""
+    description = ""
+
+    # flag for outputs, eg, plots or file save may not have "output"
+    _has_output = True
+
+    # Set to False in subclasses whose _process_core has side effects (e.g. printing),
+    # so that they always run instead of being served from the memo cache
+    _memoize = True
+
+    # Elementwise nodes name their operation (see Compiler.ELEMENTWISE_OPS) so that
+    # chains of them can be fused into a single kernel
+    _elementwise_op = None
+
+    # How to tell that a recomputed output hasn't changed (one of the *_CUTOFF
+    # names). Use "none" in nodes that update their output object in place
+    _cutoff = EQUALITY_CUTOFF
+
+    # Set to True in nodes whose _process_core writes into self._output_buffer(...),
+    # so that evaluating them again with the same shapes allocates nothing. An array
+    # output may be overwritten in place, so it always counts as changed (no cutoff)
+    _reuse_output = False
+
+    # True for classes whose _process_core is a coroutine function (async def), e.g.
+    # nodes that wait for instruments or files. Set automatically; such nodes run
+    # concurrently with each other (see process_nodes_async)
+    _is_async = False
+
+    def __init_subclass__(cls, **kwargs):
+        global _have_async_nodes
+        super().__init_subclass__(**kwargs)
+        cls._is_async = inspect.iscoroutinefunction(cls._process_core)
+        if cls._is_async:
+            _have_async_nodes = True
+
     def __init__(self):
         # This looks like a dict of arguments to a function, but every argument is a Node
         self._input_terminals = {}
 
-        # Each node can only have one output. This is a list of nodes that have signed up 
-        # to receive the output of this node as one of their inputs.
-        self._output_terminals = []
-        
-        # flag for outputs, eg, plots or file save may not have "output"
-        self._has_output = True
-        
-        self.description = ""
-        self.displayName = ""
+        # Each node can only have one output. These are the nodes that have signed up
+        # to receive the output of this node as one of their inputs, as an ordered
+        # set (the values are unused) so that connecting stays O(1) with many outputs.
+        self._output_terminals = {}
+
         self._output_data_cache = None
         self._is_output_valid = False
         self._auto_process = False
         self._adjustable_parameters = {}
+        self._output_fingerprint = None
+        # {input key: value} used instead of the outputs of the input nodes, e.g. by
+        # copies that run without their inputs (see _detached_copy)
+        self._input_overrides = None
+        # every node this one feeds into has a larger _order (see insert_edge)
+        self._order = next(_order_counter)
+        # the memory a _reuse_output node writes its outputs into, and a weakref to
+        # the memoryview its last output was made from (see _output_buffer)
+        self._owned_buffer = None
+        self._buffer_view = None
+
+    def __getattr__(self, name):
+        # Inputs are read through the terminals, so self.arg1 is the output of the
+        # node connected to arg1. Only called for names that aren't attributes; the
+        # first time, the class gets an InputValue for the name, which is faster.
+        if name in _NODE_SLOTS or name not in self._input_terminals:
+            raise AttributeError("'" + type(self).__name__ + "' object has no attribute '" + name + "'")
+        descriptor = InputValue(name)
+        setattr(type(self), name, descriptor)
+        return descriptor.__get__(self, type(self))
 
     # -------- Private API ---------
-    def _adjust_parameter(self, key, new_value):
+    def _adjust_parameter(self, key, new_value, process=True):
+        # process=False only stores the value, e.g. while a burst of edits is coalesced
         self._adjustable_parameters[key]._value = new_value
-        self.process()
+        if process:
+            self.process()
         
     def _inputs_are_defined(self):
         # check that all inputs are connected to nodes
@@ -65,40 +214,229 @@ class Node(ABC):
                 return False
         return True
     
-    def _cache_input_vars(self):
-        # should check for validity here?
-        # cache the input data for easier access
-        for key, input_node in self._input_terminals.items():
-            vars(self)[key] = input_node._output_data_cache
-
-    def _invalidate_input_cache(self, input_node):
-        # reset cached inputs
-        for key, node in self._input_terminals.items():
-            if node == input_node:
-                vars(self)[key] = None
-
     def _notify_output_nodes(self, message):
         # go through list of nodes receiving this node's output and send message
         for output_node in self._output_terminals:
             output_node._receive_message(message, self)
 
     def _receive_message(self, message, sender):
+        # only used in observer mode; the scheduler never sends messages
         if message == Node.output_now_valid_message:
             self.process()
         elif message == Node.output_now_invalid_message:
             self._invalidate_output()
-            self._invalidate_input_cache(sender)
 
     def _invalidate_output(self):
-        # reset the output cache, "complete" flag, and cached inputs
+        # reset the output cache and "complete" flag of this node and everything downstream
+        if _batch is not None:
+            _batch.invalidated[self] = None
+        elif _evaluation_mode == OBSERVER_MODE:
+            self._clear_output()
+            self._notify_output_nodes(Node.output_now_invalid_message)
+        else:
+            invalidate_downstream([self])
+
+    def _clear_output(self):
+        # reset this node only; subclasses can hook in here to react to invalidation
         self._output_data_cache = None
         self._is_output_valid = False
-        self._notify_output_nodes(Node.output_now_invalid_message)
+        self._output_fingerprint = None
+
+    def _detached_copy(self):
+        # a copy of this node with its input values filled in but no connections,
+        # so that _process_core can run somewhere else (e.g. another process)
+        clone = copy.copy(self)
+        clone._input_terminals = dict.fromkeys(self._input_terminals)
+        clone._output_terminals = {}
+        clone._output_data_cache = None
+        clone._owned_buffer = clone._buffer_view = None
+        clone._input_overrides = {key: getattr(self, key) for key in self._input_terminals}
+        return clone
+
+    def _compute_fingerprint(self):
+        # content address of the output: the class, the parameter values, and the
+        # fingerprints of the inputs. Stable across sessions, unlike hash()
+        h = hashlib.sha1()
+        h.update((self.__class__.__module__ + '.' + self.__class__.__qualname__).encode())
+        for key in sorted(self._adjustable_parameters):
+            h.update(b'\0' + key.encode() + b'\0' + value_fingerprint(self._adjustable_parameters[key]._value))
+        missing = [n for n in self._input_terminals.values() if n._output_fingerprint is None]
+        if missing:
+            _fill_fingerprints(missing)
+        for key in sorted(self._input_terminals):
+            input_node = self._input_terminals[key]
+            h.update(b'\1' + key.encode() + b'\0' + input_node._output_fingerprint.encode())
+        return h.hexdigest()
+
+    def _output_key(self):
+        # the fingerprint downstream nodes use for this node's output. The output of
+        # a node that isn't memoized needn't follow from its parameters and inputs
+        # (e.g. a file that is read), so it is fingerprinted by its value instead
+        if self._memoize:
+            return self._compute_fingerprint()
+        return hashlib.sha1(value_fingerprint(self._output_data_cache)).hexdigest()
+
+    def _memo_lookup(self):
+        # returns (key, found, value). key is None when the memo cache is not used
+        if _memo_cache is None or not self._memoize:
+            self._output_fingerprint = None
+            return None, False, None
+        key = self._compute_fingerprint()
+        self._output_fingerprint = key
+        found, value = _memo_cache.get(key)
+        if found and _profiler is not None:
+            _profiler.record_cache_hit(self)
+        return key, found, value
+
+    def _store_output(self, value, key=None):
+        if key is not None:
+            _memo_cache.put(key, value)
+        self._output_data_cache = value
+        self._is_output_valid = True
+        if self._buffer_view is not None and self._buffer_view() is None:
+            # the output isn't in the node's buffer, which needn't be kept then
+            self._owned_buffer = self._buffer_view = None
+
+    def _output_buffer(self, shape, dtype):
+        # For the _process_core of _reuse_output nodes: an uninitialized numpy array
+        # to write the output into, e.g. with a ufunc's out=. The node never hands out
+        # _owned_buffer itself, only arrays made from a memoryview of it, which every
+        # view of such an array keeps alive. The buffer is written into again once
+        # that memoryview is gone, i.e. when nothing uses the previous output any
+        # more (not the memo cache, a view or a shared memory copy); otherwise, or
+        # when the size differs, the node gets a new buffer
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        if dtype.hasobject:
+            return np.empty(shape, dtype)
+        # the output is about to be replaced; let go of it so the buffer can be reused
+        self._output_data_cache = None
+        self._is_output_valid = False
+        nbytes = math.prod(shape) * dtype.itemsize
+        if (self._owned_buffer is None or self._owned_buffer.nbytes != nbytes or
+                self._buffer_view() is not None):
+            self._owned_buffer = np.empty(nbytes, np.uint8)
+        array = np.frombuffer(memoryview(self._owned_buffer), dtype)
+        self._buffer_view = weakref.ref(array.base)
+        return array.reshape(shape)
+
+    def _may_overwrite_output(self):
+        # whether _output_buffer could write over the current output
+        return self._reuse_output and self._owned_buffer is not None
+
+    def _process_self(self):
+        # run _process_core on the current inputs, without touching downstream nodes
+        if not self._inputs_are_valid():
+            return False
+        key, found, value = self._memo_lookup()
+        if found:
+            self._output_data_cache = value
+            self._is_output_valid = True
+            return True
+        self._store_output(self._run_process_core(), key)
+        return True
+
+    def _compares_output(self):
+        # whether _update keeps the old output to compare the new one with. Not when
+        # _output_buffer may write over it (holding on to it would prevent that),
+        # nor for large arrays under the "equality" cutoff
+        if self._cutoff == NO_CUTOFF or self._may_overwrite_output():
+            return False
+        return not (self._cutoff == EQUALITY_CUTOFF and np is not None and
+                    isinstance(self._output_data_cache, np.ndarray) and
+                    self._output_data_cache.nbytes > MAX_COMPARED_BYTES)
+
+    def _update(self):
+        # _process_self, then return whether the output may differ from before
+        if not self._compares_output():
+            self._process_self()
+            return True
+        was_valid, old_value = self._is_output_valid, self._output_data_cache
+        if not self._process_self() or not was_valid:
+            return True
+        return not same_output(self._cutoff, old_value, self._output_data_cache)
+
+    async def _process_self_async(self):
+        # _process_self, awaiting _process_core if it is async
+        if not self._inputs_are_valid():
+            return False
+        key, found, value = self._memo_lookup()
+        if found:
+            self._output_data_cache = value
+            self._is_output_valid = True
+            return True
+        self._store_output(await self._run_process_core_async(), key)
+        return True
+
+    async def _update_async(self):
+        if not self._compares_output():
+            await self._process_self_async()
+            return True
+        was_valid, old_value = self._is_output_valid, self._output_data_cache
+        if not await self._process_self_async() or not was_valid:
+            return True
+        return not same_output(self._cutoff, old_value, self._output_data_cache)
+
+    def _run_process_core(self):
+        if _profiler is None:
+            return self._call_process_core()
+        start = time.perf_counter()
+        value = self._call_process_core()
+        _profiler.record(self, start, time.perf_counter(), value)
+        return value
+
+    async def _run_process_core_async(self):
+        if not self._is_async:
+            return self._run_process_core()
+        if _profiler is None:
+            return await self._call_process_core_async()
+        start = time.perf_counter()
+        value = await self._call_process_core_async()
+        _profiler.record(self, start, time.perf_counter(), value)
+        return value
+
+    def _streamed_inputs(self):
+        if self._input_overrides is None:
+            return [key for key, input_node in self._input_terminals.items()
+                    if is_stream(input_node._output_data_cache)]
+        return [key for key in self._input_terminals if is_stream(getattr(self, key))]
+
+    def _call_process_core(self):
+        # _process_core, or _process_stream if an input is a stream of blocks and the
+        # node supports streaming. Nodes that don't get whole arrays instead.
+        if self._is_async:
+            return run_coroutine(self._call_process_core_async())
+        streamed = self._streamed_inputs()
+        if not streamed:
+            return self._process_core()
+        if hasattr(self, '_process_stream'):
+            return self._process_stream()
+        overrides = self._input_overrides
+        self._input_overrides = dict(overrides or {})
+        for key in streamed:
+            self._input_overrides[key] = collect(getattr(self, key))
+        try:
+            return self._process_core()
+        finally:
+            self._input_overrides = overrides
+
+    async def _call_process_core_async(self):
+        # the same for an async _process_core, which always gets whole arrays
+        streamed = self._streamed_inputs()
+        if not streamed:
+            return await self._process_core()
+        overrides = self._input_overrides
+        self._input_overrides = dict(overrides or {})
+        for key in streamed:
+            self._input_overrides[key] = collect(getattr(self, key))
+        try:
+            return await self._process_core()
+        finally:
+            self._input_overrides = overrides
     
     def _as_dictionary(self):
         # return a dictionary with enough information to recreate this Node
         the_dict = {"node_class": self.__class__.__name__,
-                    "adjustable_parameters": self._adjustable_parameters}
+                    "adjustable_parameters": {k: p._value for k, p in self._adjustable_parameters.items()}}
         return the_dict
 
     @abstractmethod
@@ -107,17 +445,19 @@ class Node(ABC):
         # It must be defined by subclasses and return the processed data. E.g.,
         #    _process_core(self):
         #        return self.arg1 + self.arg2
+        # Nodes that spend their time waiting (on instruments, files, the network)
+        # can define it with async def instead, and await inside it.
         pass
 
     # -------- Public API ---------
     def process(self):
-        if self._inputs_are_valid():
-            self._cache_input_vars()
-            self._output_data_cache = self._process_core()
-            self._is_output_valid = True
-            self._notify_output_nodes(Node.output_now_valid_message)
+        if _batch is not None:
+            _batch.changed[self] = None
+        elif _evaluation_mode == OBSERVER_MODE:
+            if self._inputs_are_valid() and self._update():
+                self._notify_output_nodes(Node.output_now_valid_message)
         else:
-            pass  # should really set some error flag or something?
+            request_processing([self])
 
     def disconnect_input(self, input_key):
         tmp_node = self._input_terminals[input_key]
@@ -135,17 +475,17 @@ class Node(ABC):
         if self._input_terminals[input_key] is not None:
             node_error('The input terminal ' + input_key + ' is already connected')
             return
+        insert_edge(the_node, self)
         self._input_terminals[input_key] = the_node
         the_node.connect_output(self)
         if self._auto_process:
             self.process()
         
     def connect_output(self, the_node):
-        if the_node not in self._output_terminals:
-            self._output_terminals.append(the_node)
+        self._output_terminals[the_node] = None
 
     def disconnect_output(self, the_node):
-        if the_node in self._output_terminals: self._output_terminals.remove(the_node)
+        self._output_terminals.pop(the_node, None)
     
     def set_auto_process(self, flag):
         if flag not in [True, False]:
@@ -156,6 +496,14 @@ class Node(ABC):
     def is_output_valid(self):
         return self._is_output_valid
 
+    def evaluate(self):
+        # compute (only) the stale nodes this one depends on, then return its output
+        process_nodes(stale_upstream_nodes([self]))
+        return self._output_data_cache
+
+
+_NODE_SLOTS = frozenset(Node.__slots__)
+
 
 class NodeEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -167,3 +515,355 @@ class NodeEncoder(json.JSONEncoder):
         
 def node_error(message):
     raise ValueError(message)
+
+
+def run_coroutine(coroutine):
+    # wait for a coroutine from synchronous code, e.g. an async _process_core
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    coroutine.close()
+    node_error('Nodes with an async _process_core cannot be evaluated synchronously while an '
+               'event loop is running in the same thread; use process_nodes_async instead')
+
+
+def set_evaluation_mode(mode):
+    global _evaluation_mode
+    if mode not in [SCHEDULED_MODE, LAZY_MODE, OBSERVER_MODE]:
+        node_error('The evaluation mode must be "' + SCHEDULED_MODE + '", "' + LAZY_MODE + '" or "' + OBSERVER_MODE + '"')
+        return
+    _evaluation_mode = mode
+
+
+def get_evaluation_mode():
+    return _evaluation_mode
+
+
+def set_memo_cache(cache):
+    # cache is a Cache.MemoCache (or anything with get/put), or None to turn memoization off
+    global _memo_cache
+    _memo_cache = cache
+
+
+def get_memo_cache():
+    return _memo_cache
+
+
+def set_profiler(profiler):
+    # profiler is a Profiler.Profiler, or None to stop measuring
+    global _profiler
+    _profiler = profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def same_value(a, b):
+    # cheap "did this value change" check that also copes with numpy arrays
+    if a is b:
+        return True
+    if type(a) != type(b) or getattr(a, 'shape', None) != getattr(b, 'shape', None):
+        return False
+    try:
+        equal = a == b
+        if hasattr(equal, 'all'):
+            equal = equal.all()
+        return bool(equal)
+    except (ValueError, TypeError):
+        return False
+
+
+def same_output(policy, old_value, new_value):
+    if policy == IDENTITY_CUTOFF:
+        return old_value is new_value
+    if policy == EQUALITY_CUTOFF:
+        return same_value(old_value, new_value)
+    if policy == FINGERPRINT_CUTOFF:
+        return (old_value is new_value or
+                (type(old_value) == type(new_value) and
+                 value_fingerprint(old_value) == value_fingerprint(new_value)))
+    return False
+
+
+def _array_bytes(array):
+    # the bytes of tobytes(), without copying contiguous arrays (e.g. memory-mapped
+    # parameters of an archive, which would otherwise be read into memory whole)
+    if np is None or not isinstance(array, np.ndarray) or array.dtype.hasobject:
+        return array.tobytes()
+    return memoryview(np.ascontiguousarray(array).reshape(-1).view(np.uint8))
+
+
+def value_fingerprint(value):
+    # bytes that identify a parameter value; arrays are hashed by dtype, shape and data
+    if hasattr(value, 'tobytes') and hasattr(value, 'dtype'):
+        return (str(value.dtype) + str(value.shape)).encode() + hashlib.sha1(_array_bytes(value)).digest()
+    if is_stream(value):
+        # the blocks are only made when the stream is read, so every stream differs
+        return ('ArrayStream:' + str(value.serial)).encode()
+    if isinstance(value, list):
+        # sequences (e.g. "ints" parameters) are tuples, but come back from json as lists
+        value = tuple(value)
+    return (type(value).__name__ + ':' + repr(value)).encode()
+
+
+def _fill_fingerprints(nodes):
+    # compute the missing fingerprints of nodes and of what they depend on, inputs
+    # first, so that long chains of them (e.g. inside a fused kernel, see Compiler)
+    # don't recurse
+    found = dict.fromkeys(nodes)
+    stack = list(found)
+    while stack:
+        for input_node in stack.pop()._input_terminals.values():
+            if input_node._output_fingerprint is None and input_node not in found:
+                found[input_node] = None
+                stack.append(input_node)
+    for node in sorted(found, key=lambda n: n._order):
+        node._output_fingerprint = node._output_key()
+
+
+def downstream_nodes(roots):
+    # every node reachable from roots through output terminals (roots included),
+    # in the order they were discovered
+    found = dict.fromkeys(roots)
+    stack = list(found)
+    while stack:
+        for output_node in stack.pop()._output_terminals:
+            if output_node not in found:
+                found[output_node] = None
+                stack.append(output_node)
+    return list(found)
+
+
+def stale_upstream_nodes(targets):
+    # the targets that are not valid, plus every invalid node they depend on;
+    # valid outputs stop the search
+    found = dict.fromkeys(node for node in targets if not node._is_output_valid)
+    stack = list(found)
+    while stack:
+        for input_node in stack.pop()._input_terminals.values():
+            if input_node is not None and not input_node._is_output_valid and input_node not in found:
+                found[input_node] = None
+                stack.append(input_node)
+    return list(found)
+
+
+def invalidate_downstream(roots):
+    # clear the outputs of roots and everything that depends on them; returns those
+    # nodes. Inside a batch this only happens when the batch closes
+    if _batch is not None:
+        _batch.invalidated.update(dict.fromkeys(roots))
+        return []
+    stale = downstream_nodes(roots)
+    for node in stale:
+        node._clear_output()
+    return stale
+
+
+def _cycle_error(source, target):
+    node_error('Connecting ' + (source.displayName or type(source).__name__) + ' to ' +
+               (target.displayName or type(target).__name__) + ' would make a cycle')
+
+
+def insert_edge(source, target):
+    # Check that source -> target can be added without making a cycle, and update
+    # _order so that it stays a topological order (Pearce and Kelly's dynamic
+    # topological sort). Only the nodes ordered between target and source are
+    # looked at, and nothing at all when they are already in order, which is the
+    # usual case.
+    lower, upper = target._order, source._order
+    if source is target:
+        _cycle_error(source, target)
+    if lower < upper:
+        # nodes reachable from target, among those that come no later than source
+        forward = {target: None}
+        stack = [target]
+        while stack:
+            for output_node in stack.pop()._output_terminals:
+                if output_node is source:
+                    _cycle_error(source, target)
+                if output_node._order < upper and output_node not in forward:
+                    forward[output_node] = None
+                    stack.append(output_node)
+        # nodes that reach source, among those that come no earlier than target
+        backward = {source: None}
+        stack = [source]
+        while stack:
+            for input_node in stack.pop()._input_terminals.values():
+                if input_node is not None and input_node._order > lower and input_node not in backward:
+                    backward[input_node] = None
+                    stack.append(input_node)
+        # give the same positions back, with everything that reaches source first
+        key = lambda node: node._order
+        moved = sorted(backward, key=key) + sorted(forward, key=key)
+        for node, order in zip(moved, sorted(node._order for node in moved)):
+            node._order = order
+
+
+def topological_order(nodes):
+    # connect_input keeps Node._order a topological order of the whole graph, so
+    # sorting by it is enough (and much faster than walking the edges)
+    return sorted(nodes, key=_order_of)
+
+
+def process_nodes(nodes, roots=None):
+    # Recompute the given nodes in topological order, each exactly once. Nodes
+    # whose inputs are not all valid are skipped, just like Node.process.
+    # With roots (the nodes that changed), a valid node is only recomputed when
+    # it is a root, or when one of its inputs came out different (early cutoff)
+    if _have_async_nodes and any(node._is_async for node in nodes):
+        run_coroutine(process_nodes_async(nodes, roots))
+        return
+    if roots is None:
+        for node in topological_order(nodes):
+            node._process_self()
+        return
+    cutoff = EarlyCutoff(roots)
+    for node in topological_order(nodes):
+        if cutoff.needs_update(node):
+            cutoff.updated(node, node._update())
+
+
+async def process_nodes_async(nodes, roots=None):
+    # process_nodes for use in an event loop (process_nodes uses it too, when some
+    # of the nodes are async): every node starts as soon as the nodes it depends
+    # on are done, so async nodes wait at the same time instead of one after the
+    # other. Synchronous nodes run on the thread of the event loop.
+    if roots is None:
+        await gather_nodes(nodes, Node._process_self_async)
+        return
+    cutoff = EarlyCutoff(roots)
+
+    async def update(node):
+        if cutoff.needs_update(node):
+            cutoff.updated(node, await node._update_async())
+    await gather_nodes(nodes, update)
+
+
+async def gather_nodes(nodes, step):
+    # await step(node) for every node, as soon as the steps of its inputs (those
+    # that are among nodes) are done. If steps raise, the nodes downstream are not
+    # stepped, and the exception of the first node in topological order is
+    # re-raised once everything else has finished.
+    tasks = {}
+
+    async def run(node, inputs):
+        if inputs:
+            await asyncio.gather(*inputs)
+        await step(node)
+
+    for node in topological_order(nodes):
+        inputs = [tasks[input_node] for input_node in node._input_terminals.values() if input_node in tasks]
+        tasks[node] = asyncio.ensure_future(run(node, inputs))
+    for result in await asyncio.gather(*tasks.values(), return_exceptions=True):
+        if isinstance(result, BaseException):
+            raise result
+
+
+def process_downstream(roots):
+    # bring roots and everything that depends on them up to date
+    process_nodes(downstream_nodes(roots), roots)
+
+
+class EarlyCutoff(object):
+    # Keeps track of which outputs changed while nodes are updated in topological
+    # order, so that nodes whose inputs all came out the same can be skipped
+    def __init__(self, roots):
+        self.roots = set(roots)
+        self.changed = set()
+
+    def needs_update(self, node):
+        if not node._is_output_valid or node in self.roots:
+            return True
+        changed = self.changed
+        for input_node in node._input_terminals.values():
+            if input_node in changed:
+                return True
+        return False
+
+    def updated(self, node, output_changed):
+        if output_changed:
+            self.changed.add(node)
+
+
+def set_process_handler(handler):
+    # handler(nodes, roots) is called instead of process_nodes(nodes, roots)
+    # whenever nodes need to be evaluated after a change or request; None restores
+    # synchronous evaluation. roots is None when every node should be recomputed
+    global _process_handler
+    _process_handler = handler
+
+
+def _dispatch(nodes, roots=None):
+    if _process_handler is not None:
+        _process_handler(nodes, roots)
+    else:
+        process_nodes(nodes, roots)
+
+
+def request_processing(roots):
+    # the nodes in roots changed; bring what depends on them up to date according
+    # to the evaluation mode
+    if _batch is not None:
+        _batch.changed.update(dict.fromkeys(roots))
+    elif _evaluation_mode == LAZY_MODE:
+        stale = invalidate_downstream(roots)
+        request_evaluation([node for node in stale if not node._has_output])
+    else:
+        _dispatch(downstream_nodes(roots), roots)
+
+
+def request_evaluation(targets):
+    # compute the targets, and whatever stale nodes they need
+    if _batch is not None:
+        _batch.targets.update(dict.fromkeys(targets))
+        return
+    nodes = stale_upstream_nodes(targets)
+    if nodes:
+        _dispatch(nodes)
+
+
+class Batch(object):
+    # What was changed while a batch was open, as ordered sets of nodes
+    def __init__(self):
+        self.changed = {}      # nodes to process
+        self.invalidated = {}  # nodes whose outputs (and everything downstream) are stale
+        self.targets = {}      # nodes whose values were requested
+
+    def commit(self):
+        # invalidate once, then evaluate everything affected in one topological pass
+        if self.invalidated:
+            invalidate_downstream(list(self.invalidated))
+        if self.changed:
+            request_processing(list(self.changed))
+        if self.targets:
+            request_evaluation(list(self.targets))
+
+    def discard(self, nodes):
+        # leave nodes out of the commit, e.g. nodes whose outputs were read from a file
+        for node in nodes:
+            self.changed.pop(node, None)
+            self.invalidated.pop(node, None)
+            self.targets.pop(node, None)
+
+
+@contextmanager
+def batch():
+    # Make many edits (connections, parameters, deletions) without evaluating
+    # anything in between, e.g.
+    #     with batch():
+    #         for ...: node.connect_input(key, other)
+    # Invalidation and processing are held back until the outermost batch closes,
+    # so in the meantime outputs may be out of date.
+    global _batch
+    if _batch is not None:
+        yield _batch
+        return
+    _batch = current = Batch()
+    try:
+        yield current
+    finally:
+        _batch = None
+        current.commit()
+
@@ -1,38 +1,90 @@
 # -*- coding: utf-8 -*-
 """
-Nodes which know about numpy arrays
+Nodes which know about numpy arrays. Where numpy can, they return views of their
+inputs rather than copies (slicing, reshaping, transposing, broadcasting)
 """
-from pictograph.Node import Node, AdjustableParameter
+from pictograph.Node import Node, AdjustableParameter, node_error
+from pictograph.Streaming import chunks, collect
 import numpy as np
-from PyQt5 import QtCore, QtWidgets, QtGui
+import shutil
+import tempfile
+
+# the choices of the "dtype" parameters; float32 takes half the memory of float64
+DTYPES = ["float64", "float32", "int64", "int32", "int16", "uint8", "complex128", "complex64", "bool"]
+
+
+def dtype_parameter(default="float64"):
+    return AdjustableParameter(name="dtype", type="options", val=default, values=DTYPES)
+
+
+def parse_index(text):
+    # numpy's indexing syntax, e.g. "0, 1:10:2, ..." -> (0, slice(1, 10, 2), Ellipsis).
+    # Only basic indexing, so the result of indexing with it is a view
+    index = []
+    parts = [part.strip() for part in text.split(',')]
+    if parts == ['']:
+        return ()
+    for part in parts:
+        if part == '...':
+            index.append(Ellipsis)
+        elif part in ['None', 'newaxis']:
+            index.append(None)
+        elif ':' in part:
+            bounds = [int(b) if b.strip() else None for b in part.split(':')]
+            if len(bounds) > 3:
+                node_error('"' + part + '" is not a slice')
+            index.append(slice(*bounds))
+        else:
+            index.append(int(part))
+    return tuple(index)
+
 
 class ZerosNode(Node):
+    __slots__ = ()
+    displayName = "Np Zeros"
+    description = "Create Numpy Array of Zeros"
+
+    # evaluating again writes into the same memory (see Node._output_buffer)
+    _reuse_output = True
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Np Zeros"
-        self.description = "Create Numpy Array of Zeros"
-        self._adjustable_parameters = {"Length": AdjustableParameter(name="Length", type="int", val=0)}
-    
+        self._adjustable_parameters = {"Length": AdjustableParameter(name="Length", type="int", val=0),
+                                       "dtype": dtype_parameter()}
+
     def _process_core(self):
-        return np.zeros((1,self._adjustable_parameters["Length"]._value))
+        p = self._adjustable_parameters
+        out = self._output_buffer((1, p["Length"]._value), p["dtype"]._value)
+        out.fill(0)
+        return out
 
 
 class OnesNode(Node):
+    __slots__ = ()
+    displayName = "Np Ones"
+    description = "Create Numpy Array of Ones"
+
+    _reuse_output = True
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Np Ones"
-        self.description = "Create Numpy Array of Ones"
-        self._adjustable_parameters = {"Length": AdjustableParameter(name="Length", type="int", val=0)}
+        self._adjustable_parameters = {"Length": AdjustableParameter(name="Length", type="int", val=0),
+                                       "dtype": dtype_parameter()}
 
     def _process_core(self):
-        return np.ones((1,self._adjustable_parameters["Length"]._value))
+        p = self._adjustable_parameters
+        out = self._output_buffer((1, p["Length"]._value), p["dtype"]._value)
+        out.fill(1)
+        return out
 
 
 class npVectorNode(Node):
+    __slots__ = ()
+    displayName = "np Vector"
+    description = "A numpy vector"
+
     def __init__(self, v=np.zeros(1)):
         super().__init__()
-        self.displayName = "np Vector"
-        self.description = "A numpy vector"
         self._adjustable_parameters = {"Vector": AdjustableParameter(name="Vector", type="Vector", val=v)}
         self._output_data_cache = self._adjustable_parameters["Vector"]._value
         self._is_output_valid = True
@@ -41,6 +93,308 @@ class npVectorNode(Node):
         self._output_data_cache = self._adjustable_parameters["Vector"]._value
         return self._output_data_cache
 
+
+class FullNode(Node):
+    __slots__ = ()
+    displayName = "Np Full"
+    description = "Create a Numpy Array of any shape, filled with one value"
+
+    _reuse_output = True
+
+    def __init__(self):
+        super().__init__()
+        self._adjustable_parameters = {"Shape": AdjustableParameter(name="Shape", type="ints", val=(1,)),
+                                       "Fill value": AdjustableParameter(name="Fill value", type="double", val=0.0),
+                                       "dtype": dtype_parameter()}
+
+    def _process_core(self):
+        p = self._adjustable_parameters
+        out = self._output_buffer(p["Shape"]._value, p["dtype"]._value)
+        out.fill(p["Fill value"]._value)
+        return out
+
+
+class ArangeNode(Node):
+    __slots__ = ()
+    displayName = "Np Arange"
+    description = "Evenly spaced values from Start up to (not including) Stop"
+
+    def __init__(self):
+        super().__init__()
+        self._adjustable_parameters = {"Start": AdjustableParameter(name="Start", type="double", val=0.0),
+                                       "Stop": AdjustableParameter(name="Stop", type="double", val=10.0),
+                                       "Step": AdjustableParameter(name="Step", type="double", val=1.0),
+                                       "dtype": dtype_parameter()}
+
+    def _process_core(self):
+        p = self._adjustable_parameters
+        return np.arange(p["Start"]._value, p["Stop"]._value, p["Step"]._value, dtype=p["dtype"]._value)
+
+
+class LinspaceNode(Node):
+    __slots__ = ()
+    displayName = "Np Linspace"
+    description = "Count evenly spaced values from Start to Stop"
+
+    def __init__(self):
+        super().__init__()
+        self._adjustable_parameters = {"Start": AdjustableParameter(name="Start", type="double", val=0.0),
+                                       "Stop": AdjustableParameter(name="Stop", type="double", val=1.0),
+                                       "Count": AdjustableParameter(name="Count", type="int", val=50),
+                                       "dtype": dtype_parameter()}
+
+    def _process_core(self):
+        p = self._adjustable_parameters
+        return np.linspace(p["Start"]._value, p["Stop"]._value, p["Count"]._value, dtype=p["dtype"]._value)
+
+
+class AsTypeNode(Node):
+    __slots__ = ()
+    displayName = "Np As Type"
+    description = "Convert an array to another dtype (no copy if it has that dtype already)"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"dtype": dtype_parameter("float32")}
+
+    def _process_core(self):
+        return np.asarray(self.arg1).astype(self._adjustable_parameters["dtype"]._value, copy=False)
+
+
+class ReduceNode(Node):
+    __slots__ = ()
+    displayName = "Np Reduce"
+    description = "Sum, mean, min, ... over some axes (all of them if Axes is empty)"
+
+    OPERATIONS = ["sum", "mean", "min", "max", "prod", "std", "var"]
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Operation": AdjustableParameter(name="Operation", type="options", val="sum",
+                                                                        values=self.OPERATIONS),
+                                       "Axes": AdjustableParameter(name="Axes", type="ints", val=())}
+
+    def _process_core(self):
+        p = self._adjustable_parameters
+        axes = tuple(p["Axes"]._value) or None
+        return getattr(np, p["Operation"]._value)(self.arg1, axis=axes)
+
+
+class MatMulNode(Node):
+    __slots__ = ()
+    displayName = "Np MatMul"
+    description = "Matrix product of two arrays"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None, "arg2": None}
+
+    def _process_core(self):
+        return np.matmul(self.arg1, self.arg2)
+
+
+class FFTNode(Node):
+    __slots__ = ()
+    displayName = "Np FFT"
+    description = "Discrete Fourier transform along one axis"
+
+    TRANSFORMS = ["fft", "ifft", "rfft", "irfft"]
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Transform": AdjustableParameter(name="Transform", type="options", val="fft",
+                                                                        values=self.TRANSFORMS),
+                                       "Axis": AdjustableParameter(name="Axis", type="int", val=-1)}
+
+    def _process_core(self):
+        p = self._adjustable_parameters
+        return getattr(np.fft, p["Transform"]._value)(self.arg1, axis=p["Axis"]._value)
+
+
+class ConvolveNode(Node):
+    __slots__ = ()
+    displayName = "Np Convolve"
+    description = "Convolution of two 1-D arrays"
+
+    MODES = ["full", "same", "valid"]
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None, "arg2": None}
+        self._adjustable_parameters = {"Mode": AdjustableParameter(name="Mode", type="options", val="full",
+                                                                   values=self.MODES)}
+
+    def _process_core(self):
+        return np.convolve(self.arg1, self.arg2, mode=self._adjustable_parameters["Mode"]._value)
+
+
+class SliceNode(Node):
+    __slots__ = ()
+    displayName = "Np Slice"
+    description = "Index an array, e.g. 0, 1:10:2, ... (a view, not a copy)"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Index": AdjustableParameter(name="Index", type="string", val=":")}
+
+    def _process_core(self):
+        return np.asarray(self.arg1)[parse_index(self._adjustable_parameters["Index"]._value)]
+
+
+class ReshapeNode(Node):
+    __slots__ = ()
+    displayName = "Np Reshape"
+    description = "Give an array a new shape; one length may be -1 (a view when possible)"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Shape": AdjustableParameter(name="Shape", type="ints", val=(-1,))}
+
+    def _process_core(self):
+        return np.reshape(self.arg1, tuple(self._adjustable_parameters["Shape"]._value))
+
+
+class TransposeNode(Node):
+    __slots__ = ()
+    displayName = "Np Transpose"
+    description = "Permute the axes of an array, reversing them if Axes is empty (a view)"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Axes": AdjustableParameter(name="Axes", type="ints", val=())}
+
+    def _process_core(self):
+        return np.transpose(self.arg1, tuple(self._adjustable_parameters["Axes"]._value) or None)
+
+
+class BroadcastNode(Node):
+    __slots__ = ()
+    displayName = "Np Broadcast"
+    description = "Repeat an array to a larger shape without copying it (a read-only view)"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Shape": AdjustableParameter(name="Shape", type="ints", val=(1,))}
+
+    def _process_core(self):
+        return np.broadcast_to(self.arg1, tuple(self._adjustable_parameters["Shape"]._value))
+
+
+class ChunkNode(Node):
+    __slots__ = ()
+    displayName = "Chunk"
+    description = "Split an array into a stream of blocks along an axis"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Chunk size": AdjustableParameter(name="Chunk size", type="int", val=65536),
+                                       "Axis": AdjustableParameter(name="Axis", type="int", val=0)}
+
+    def _process_core(self):
+        return chunks(np.asanyarray(self.arg1), max(1, self._adjustable_parameters["Chunk size"]._value),
+                      self._adjustable_parameters["Axis"]._value)
+
+
+class NpyFileStreamNode(Node):
+    __slots__ = ()
+    displayName = "Stream .npy"
+    description = "Read a .npy file as a stream of blocks of rows"
+
+    # the file may change between runs
+    _memoize = False
+
+    def __init__(self):
+        super().__init__()
+        self._adjustable_parameters = {"Filename": AdjustableParameter(name="Filename", type="string", val=""),
+                                       "Chunk size": AdjustableParameter(name="Chunk size", type="int", val=65536)}
+
+    def _process_core(self):
+        # memory-mapped, so only the block being processed is ever read from disk
+        array = np.load(self._adjustable_parameters["Filename"]._value, mmap_mode='r')
+        return chunks(array, max(1, self._adjustable_parameters["Chunk size"]._value))
+
+
+class CollectNode(Node):
+    __slots__ = ()
+    displayName = "Collect"
+    description = "Join a stream of blocks into one array"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+
+    def _process_core(self):
+        # streams are collected before _process_core is called
+        return self.arg1
+
+
+class StreamSumNode(Node):
+    __slots__ = ()
+    displayName = "Sum"
+    description = "Sum of all elements, one block at a time"
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+
+    def _process_stream(self):
+        return sum(block.sum() for block in self.arg1)
+
+    def _process_core(self):
+        return np.sum(self.arg1)
+
+
+class SaveNpyNode(Node):
+    __slots__ = ()
+    displayName = "Save .npy"
+    description = "Write an array or a stream of blocks to a .npy file"
+
+    _memoize = False
+
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {"Filename": AdjustableParameter(name="Filename", type="string", val="")}
+
+    def _process_stream(self):
+        # The shape is only known at the end, so the blocks go to a temporary file
+        # first and are then copied behind the .npy header
+        filename = self._adjustable_parameters["Filename"]._value
+        if self.arg1.axis != 0:
+            np.save(filename, collect(self.arg1))
+            return filename
+        shape = None
+        with tempfile.TemporaryFile() as raw:
+            for block in self.arg1:
+                block = np.ascontiguousarray(block)
+                if shape is None:
+                    shape, dtype = list(block.shape), block.dtype
+                else:
+                    shape[0] += block.shape[0]
+                raw.write(block.tobytes())
+            if shape is None:
+                return None
+            raw.seek(0)
+            header = {'descr': np.lib.format.dtype_to_descr(dtype),
+                      'fortran_order': False, 'shape': tuple(shape)}
+            with open(filename, 'wb') as f:
+                np.lib.format.write_array_header_2_0(f, header)
+                shutil.copyfileobj(raw, f)
+        return filename
+
+    def _process_core(self):
+        filename = self._adjustable_parameters["Filename"]._value
+        np.save(filename, self.arg1)
+        return filename
+
 #     def as_widget(self):
 #         labelWidget = QtWidgets.QLabel("Here's a plot:")
 # 
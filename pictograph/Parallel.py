@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Evaluate independent branches of a graph at the same time, on a thread or process pool
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import os
+import time
+
+from pictograph.Node import node_error, topological_order, get_profiler
+from pictograph.SharedArrays import share, export, open_shared, start_tracker
+
+THREAD_EXECUTOR = "thread"
+PROCESS_EXECUTOR = "process"
+
+
+def make_executor(kind, max_workers=None):
+    if kind == THREAD_EXECUTOR:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    if kind == PROCESS_EXECUTOR:
+        return ProcessPoolExecutor(max_workers=max_workers)
+    node_error('The executor must be either "' + THREAD_EXECUTOR + '" or "' + PROCESS_EXECUTOR + '"')
+
+
+def _run_node(node):
+    return node._run_process_core()
+
+
+def _run_detached(node):
+    # runs in a worker process; the timing goes back to be recorded by the profiler
+    # of the main process. Large arrays come and go through shared memory
+    node._input_overrides = {key: open_shared(value) for key, value in node._input_overrides.items()}
+    start = time.perf_counter()
+    value = node._call_process_core()
+    end = time.perf_counter()
+    return export(value), start, end, os.getpid()
+
+
+def _submit(executor, node):
+    if isinstance(executor, ProcessPoolExecutor):
+        # the node itself holds references to the whole graph, so only send a copy
+        # that knows its input values
+        clone = node._detached_copy()
+        clone._input_overrides = {key: share(value) for key, value in clone._input_overrides.items()}
+        return executor.submit(_run_detached, clone)
+    return executor.submit(_run_node, node)
+
+
+def _result(executor, future, node):
+    result = future.result()
+    if not isinstance(executor, ProcessPoolExecutor):
+        return result
+    value, start, end, pid = result
+    value = open_shared(value, owner=True)
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.record(node, start, end, value, thread=pid)
+    return value
+
+
+def process_nodes_parallel(nodes, executor):
+    # Same result as Node.process_nodes, but every node whose inputs are ready is
+    # handed to the executor at once. Outputs are stored from this thread only.
+    # If nodes raise, the exception of the first of them in topological order is
+    # re-raised once everything already running has finished.
+    order = topological_order(nodes)
+    position = {node: i for i, node in enumerate(order)}
+    waiting_for = {node: 0 for node in order}
+    for node in order:
+        for output_node in node._output_terminals:
+            if output_node in waiting_for:
+                waiting_for[output_node] += 1
+
+    ready = [node for node in order if waiting_for[node] == 0]
+    running = {}
+    errors = []
+    if isinstance(executor, ProcessPoolExecutor):
+        start_tracker()
+
+    def finished(node):
+        for output_node in node._output_terminals:
+            if output_node in waiting_for:
+                waiting_for[output_node] -= 1
+                if waiting_for[output_node] == 0:
+                    ready.append(output_node)
+
+    while ready or running:
+        while ready and not errors:
+            node = ready.pop(0)
+            if not node._inputs_are_valid():
+                finished(node)
+                continue
+            key, found, value = node._memo_lookup()
+            if found:
+                node._store_output(value)
+                finished(node)
+            else:
+                running[_submit(executor, node)] = (node, key)
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=lambda f: position[running[f][0]]):
+            node, key = running.pop(future)
+            try:
+                value = _result(executor, future, node)
+            except Exception as e:
+                errors.append((position[node], e))
+                continue
+            node._store_output(value, key)
+            finished(node)
+
+    if errors:
+        raise min(errors, key=lambda error: error[0])[1]
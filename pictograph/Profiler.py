@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Per-node timing: how often each node ran, how long _process_core took, how big its
+output was, and how often the memo cache answered instead. E.g.,
+    with Profiler() as profiler:
+        graph.run()
+    print(profiler.format_table(graph.node_labels()))
+
+Nothing is measured unless a profiler is installed (see Node.set_profiler).
+"""
+from collections import deque
+import json
+import os
+import threading
+
+from pictograph.Cache import size_of
+from pictograph.Node import get_profiler, set_profiler
+from pictograph.Streaming import is_stream
+
+
+class NodeStats(object):
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+        # None until the node has made an output that isn't a stream
+        self.output_bytes = None
+        self.cache_hits = 0
+
+    def as_dict(self):
+        return {'calls': self.calls, 'total_time': self.total_time, 'last_time': self.last_time,
+                'output_bytes': self.output_bytes, 'cache_hits': self.cache_hits}
+
+
+class Profiler(object):
+    def __init__(self, max_events=100000):
+        self._lock = threading.Lock()
+        self.stats = {}  # node -> NodeStats
+        # (node, start, end, thread) of the most recent runs, for the trace
+        self.events = deque(maxlen=max_events)
+        self._previous = None
+
+    # installed for the duration of a with block
+    def __enter__(self):
+        self._previous = get_profiler()
+        set_profiler(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        set_profiler(self._previous)
+        self._previous = None
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.events.clear()
+
+    def _stats_for(self, node):
+        stats = self.stats.get(node)
+        if stats is None:
+            name = node.displayName or node.__class__.__name__
+            stats = self.stats[node] = NodeStats(name + '#' + str(len(self.stats)))
+        return stats
+
+    # -------- Called by the nodes, from any thread ---------
+    def record(self, node, start, end, value, thread=None):
+        # start and end are time.perf_counter() values
+        if thread is None:
+            thread = threading.get_ident()
+        output_bytes = None if is_stream(value) else size_of(value)
+        with self._lock:
+            stats = self._stats_for(node)
+            stats.calls += 1
+            stats.last_time = end - start
+            stats.total_time += end - start
+            if output_bytes is not None:
+                stats.output_bytes = output_bytes
+            self.events.append((node, start, end, thread))
+
+    def record_cache_hit(self, node):
+        with self._lock:
+            self._stats_for(node).cache_hits += 1
+
+    # -------- Reports ---------
+    def _label(self, node, labels):
+        if labels and node in labels:
+            return labels[node]
+        return self.stats[node].label
+
+    def report(self, labels=None):
+        # one dict per node, slowest first. labels maps nodes to the names to use
+        # (e.g. Graph.node_labels()); others are named after their class
+        with self._lock:
+            rows = [dict(stats.as_dict(), node=self._label(node, labels))
+                    for node, stats in self.stats.items()]
+        return sorted(rows, key=lambda row: row['total_time'], reverse=True)
+
+    def heat(self):
+        # node -> its total time as a fraction of the slowest node's
+        with self._lock:
+            slowest = max((s.total_time for s in self.stats.values()), default=0.0)
+            if slowest <= 0:
+                return {node: 0.0 for node in self.stats}
+            return {node: s.total_time / slowest for node, s in self.stats.items()}
+
+    def format_table(self, labels=None):
+        lines = ['{:<24} {:>6} {:>12} {:>12} {:>12} {:>6}'.format(
+            'node', 'calls', 'total ms', 'last ms', 'bytes', 'hits')]
+        for row in self.report(labels):
+            lines.append('{:<24} {:>6} {:>12.3f} {:>12.3f} {:>12} {:>6}'.format(
+                row['node'], row['calls'], row['total_time'] * 1000, row['last_time'] * 1000,
+                '-' if row['output_bytes'] is None else row['output_bytes'], row['cache_hits']))
+        return '\n'.join(lines)
+
+    def to_json(self, labels=None):
+        return json.dumps({'nodes': self.report(labels)}, indent=2)
+
+    def chrome_trace(self, labels=None):
+        # the Trace Event Format read by chrome://tracing and Perfetto
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        if not events:
+            return {'traceEvents': [], 'displayTimeUnit': 'ms'}
+        origin = min(start for _, start, _, _ in events)
+        trace = []
+        for node, start, end, thread in events:
+            trace.append({'name': self._label(node, labels), 'cat': node.__class__.__name__, 'ph': 'X',
+                          'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6,
+                          'pid': pid, 'tid': thread})
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def save_json(self, filename, labels=None):
+        with open(filename, 'w') as f:
+            f.write(self.to_json(labels))
+
+    def save_chrome_trace(self, filename, labels=None):
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(labels), f)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+A registry of node classes, so that every module of glyphs is imported only once and
+the same class objects are used by the sidebar, the file loaders and the headless runner
+"""
+import importlib
+import importlib.util
+
+from pictograph.Node import Node, node_error
+
+
+def is_node_class(obj):
+    return isinstance(obj, type) and issubclass(obj, Node) and obj is not Node
+
+
+class NodeRegistry(object):
+    def __init__(self):
+        # module name -> module
+        self._modules = {}
+        # (node_module, node_class) as written in files -> class
+        self._classes = {}
+
+    def load_module(self, mod_name, path=None):
+        # import mod_name (from path, if given), unless it was loaded before
+        if mod_name in self._modules:
+            return self._modules[mod_name]
+        if path:
+            spec = importlib.util.spec_from_file_location(mod_name, path)
+            if spec is None:
+                node_error("Can't find the module " + mod_name)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        else:
+            try:
+                module = importlib.import_module(mod_name)
+            except ImportError:
+                node_error("Can't find the module " + mod_name)
+        self._modules[mod_name] = module
+        return module
+
+    def node_classes(self, mod_name, path=None):
+        # name -> class for every node class in the module
+        module = self.load_module(mod_name, path)
+        return {name: obj for name, obj in sorted(module.__dict__.items()) if is_node_class(obj)}
+
+    def find(self, module_name, class_name):
+        # node_module is stored relative to the pictograph package by the GUI
+        # (e.g. "customNodes"), but fully qualified names are accepted too
+        key = (module_name, class_name)
+        if key not in self._classes:
+            candidates = ['pictograph.' + module_name, module_name]
+            if module_name in self._modules:
+                candidates.insert(0, module_name)
+            for name in candidates:
+                if name not in self._modules:
+                    try:
+                        self.load_module(name)
+                    except ValueError:
+                        continue
+                node_class = self._modules[name].__dict__.get(class_name)
+                if is_node_class(node_class):
+                    self._classes[key] = node_class
+                    break
+            else:
+                node_error('Cannot find the node class ' + class_name + ' in the module ' + module_name)
+        return self._classes[key]
+
+
+# shared by the GUI and pictograph.Graph
+node_registry = NodeRegistry()
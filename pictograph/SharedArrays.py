@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Numpy arrays passed between this process and the workers of a process pool through
+shared memory, instead of being pickled. Only a small SharedArray handle is
+pickled; the other side maps the same memory and gets a read-only view of it. E.g.,
+    handle = share(array)         # in this process
+    array = open_shared(handle)   # in a worker
+
+A segment lives as long as the array that holds it: it is released when the last
+reference to the array (or to a view of it) goes away. For node outputs that is when
+the output is invalidated, unless a memo cache or a downstream node still uses it.
+"""
+import atexit
+from multiprocessing import resource_tracker, shared_memory
+import os
+import threading
+import weakref
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Segments are only used on posix systems: on Windows a segment disappears as soon
+# as the worker that made it closes it, before this process can map it
+ENABLED = np is not None and os.name == 'posix'
+
+# smaller arrays are quicker to pickle than to put in a segment of their own
+MIN_SHARED_BYTES = 1 << 16
+
+_lock = threading.RLock()
+# id(array) -> (weakref to the array, SharedArray, finalizer) for every array that is in a segment
+_shared = {}
+# segment name -> weakref to the array that maps it in this process
+_opened = {}
+# segment name -> SharedMemory for the segments this process unlinks when it is done
+_owned = {}
+# (pid, whether that process shares the resource tracker of its parent)
+_tracker_checked = (None, False)
+
+
+class SharedArray(object):
+    # A picklable reference to an array in a shared memory segment
+    __slots__ = ('name', 'shape', 'dtype')
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __repr__(self):
+        return 'SharedArray(' + repr(self.name) + ', ' + str(self.shape) + ', ' + str(self.dtype) + ')'
+
+
+def _shares_tracker():
+    # whether this process registers segments with the resource tracker of the
+    # process that started it, i.e. had one before it made a segment itself
+    global _tracker_checked
+    pid, shares = _tracker_checked
+    if pid != os.getpid():
+        shares = resource_tracker._resource_tracker._fd is not None
+        _tracker_checked = (os.getpid(), shares)
+    return shares
+
+
+def _segment(name=None, size=0, owner=True):
+    # The resource tracker unlinks the segments registered with it that are still
+    # there when the program ends, e.g. after a crash. Workers normally share the
+    # tracker of this process (see start_tracker), which keeps a set of names: a
+    # segment registered again is harmless, and the owner's unlink() unregisters
+    # it. A worker with a tracker of its own must not register the segments it
+    # passes on, or they would be unlinked as soon as the worker exits
+    track = owner or _shares_tracker()
+    try:
+        return shared_memory.SharedMemory(name, create=name is None, size=size, track=track)
+    except TypeError:
+        # python < 3.13 has no track argument and always registers
+        shm = shared_memory.SharedMemory(name, create=name is None, size=size)
+        if not track:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def start_tracker():
+    # In this process, before a process pool starts its workers: forked workers
+    # only share the resource tracker of this process if it is already running
+    if ENABLED:
+        resource_tracker.ensure_running()
+
+
+def worth_sharing(value):
+    return (ENABLED and isinstance(value, np.ndarray) and not value.dtype.hasobject
+            and value.nbytes >= MIN_SHARED_BYTES)
+
+
+def _view(shm, shape, dtype):
+    array = np.ndarray(shape, dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    return array
+
+
+def _register(array, handle, shm, owner):
+    # called with _lock held
+    key = id(array)
+    finalizer = weakref.finalize(array, _release, key, handle.name, shm, owner)
+    _shared[key] = (weakref.ref(array), handle, finalizer)
+    if owner:
+        _owned[handle.name] = shm
+
+
+def _release(key, name, shm, owner):
+    # the array is gone: unmap the segment, and unlink it if this process owns it
+    with _lock:
+        _shared.pop(key, None)
+        _opened.pop(name, None)
+        _owned.pop(name, None)
+    try:
+        shm.close()
+    except BufferError:
+        # still exported by something; the mapping goes when the SharedMemory does
+        pass
+    if owner:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _handle_of(array):
+    # called with _lock held
+    entry = _shared.get(id(array))
+    if entry is not None and entry[0]() is array:
+        return entry[1]
+    return None
+
+
+def share(value):
+    # In this process: a handle to pass a large array to a worker. The array is
+    # copied into a segment the first time; the segment stays until the array is
+    # released, so that other workers and later runs use the same copy. Arrays
+    # that came from a worker (see open_shared) are in a segment already. Other
+    # values are returned as they are, to be pickled.
+    if not worth_sharing(value):
+        return value
+    with _lock:
+        handle = _handle_of(value)
+        if handle is not None:
+            return handle
+        shm = _segment(size=value.nbytes)
+        np.ndarray(value.shape, value.dtype, buffer=shm.buf)[...] = value
+        handle = SharedArray(shm.name, value.shape, value.dtype)
+        _register(value, handle, shm, owner=True)
+    return handle
+
+
+def export(value):
+    # In a worker: a handle to send a large result back with. The receiving process
+    # owns the new segment (see open_shared with owner=True). Inputs that are
+    # returned unchanged keep the segment they came in.
+    if not worth_sharing(value):
+        return value
+    with _lock:
+        handle = _handle_of(value)
+    if handle is not None:
+        return handle
+    shm = _segment(size=value.nbytes, owner=False)
+    np.ndarray(value.shape, value.dtype, buffer=shm.buf)[...] = value
+    shm.close()
+    return SharedArray(shm.name, value.shape, value.dtype)
+
+
+def open_shared(value, owner=False):
+    # The array a handle refers to, as a read-only view of the segment; other values
+    # are returned as they are. A segment is only mapped once per process. With
+    # owner, this process unlinks the segment once the array is released.
+    if not isinstance(value, SharedArray):
+        return value
+    with _lock:
+        ref = _opened.get(value.name)
+        array = ref() if ref is not None else None
+        if array is not None:
+            return array
+        shm = _segment(value.name, owner=owner)
+        array = _view(shm, value.shape, value.dtype)
+        _opened[value.name] = weakref.ref(array)
+        _register(array, value, shm, owner)
+    return array
+
+
+def shared_segments():
+    # the names of the segments this process will unlink, e.g. for tests
+    with _lock:
+        return list(_owned)
+
+
+@atexit.register
+def _unlink_all():
+    # arrays that are still alive at exit
+    with _lock:
+        segments = list(_owned.values())
+        _owned.clear()
+    for shm in segments:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
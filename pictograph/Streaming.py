@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Streams of array blocks, so that pipelines can work on data larger than memory.
+
+A node may output an ArrayStream instead of a whole array. Nodes that define
+_process_stream receive the stream as-is and return another stream, so every block
+flows through the whole chain before the next one is made. Nodes that don't get the
+stream collected into one array first (see Node._call_process_core).
+"""
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# numbers streams, to tell them apart in fingerprints (see Node.value_fingerprint)
+_serials = itertools.count()
+
+
+class ArrayStream(object):
+    # A re-iterable sequence of blocks, made lazily: every iteration calls
+    # make_blocks() again, so several downstream nodes can each read the stream.
+    # Blocks are concatenated along axis to get the whole array.
+    def __init__(self, make_blocks, axis=0):
+        self._make_blocks = make_blocks
+        self.axis = axis
+        self.serial = next(_serials)
+
+    def __iter__(self):
+        return iter(self._make_blocks())
+
+    def __repr__(self):
+        return 'ArrayStream(axis=' + str(self.axis) + ')'
+
+
+def is_stream(value):
+    return isinstance(value, ArrayStream)
+
+
+def chunks(array, size, axis=0):
+    # a stream of views of array, size elements long along axis
+    def make_blocks():
+        index = [slice(None)] * array.ndim
+        for start in range(0, array.shape[axis], size):
+            index[axis] = slice(start, start + size)
+            yield array[tuple(index)]
+    return ArrayStream(make_blocks, axis)
+
+
+def elementwise(func, *args):
+    # Apply func block by block. Arguments that are not streams (e.g. scalars) are
+    # passed to every call, so they must broadcast against a single block.
+    streams = [a for a in args if is_stream(a)]
+    axis = streams[0].axis
+    if any(s.axis != axis for s in streams):
+        raise ValueError('Cannot combine streams that are split along different axes')
+
+    def make_blocks():
+        iterators = [iter(a) if is_stream(a) else None for a in args]
+        while True:
+            blocks = []
+            for a, it in zip(args, iterators):
+                if it is None:
+                    blocks.append(a)
+                    continue
+                block = next(it, None)
+                if block is None:
+                    return
+                blocks.append(block)
+            yield func(*blocks)
+    return ArrayStream(make_blocks, axis)
+
+
+def collect(value):
+    # the whole array for a stream; anything else is returned unchanged
+    if not is_stream(value):
+        return value
+    return np.concatenate(list(value), axis=value.axis)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Coalesce bursts of parameter changes (e.g. one per keystroke) into a single evaluation
+"""
+from pictograph.Node import get_evaluation_mode, OBSERVER_MODE, request_processing
+
+
+class ParameterUpdateQueue(object):
+    def __init__(self):
+        # (node, parameter name) -> latest value, in the order they were first changed
+        self._pending = {}
+
+    def submit(self, node, key, value):
+        # remember the value; nothing is evaluated until flush()
+        self._pending[(node, key)] = value
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def discard(self):
+        self._pending.clear()
+
+    def flush(self):
+        # apply the last value submitted for each parameter, then evaluate every
+        # affected node once. Returns the nodes whose parameters changed
+        pending, self._pending = self._pending, {}
+        nodes = []
+        for (node, key), value in pending.items():
+            node._adjust_parameter(key, value, process=False)
+            if node not in nodes:
+                nodes.append(node)
+        if get_evaluation_mode() == OBSERVER_MODE:
+            for node in nodes:
+                node.process()
+        elif nodes:
+            request_processing(nodes)
+        return nodes
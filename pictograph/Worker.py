@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Evaluate nodes on a background thread, so that slow nodes never block the GUI.
+Progress is reported back to the GUI thread through Qt signals.
+"""
+import asyncio
+import threading
+
+from PyQt5 import QtCore
+
+from pictograph.Node import EarlyCutoff, topological_order, same_output, gather_nodes, downstream_nodes
+
+STALE = "stale"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# stands in for old outputs that are not compared (see _previous_output)
+_NOT_COMPARED = object()
+
+
+def _previous_output(node):
+    # what to compare a node's new output with, for early cutoff. Outputs that may be
+    # overwritten and large arrays always count as changed, and are not held on to
+    # (see Node._compares_output)
+    if not node._compares_output():
+        return _NOT_COMPARED
+    return node._output_data_cache
+
+
+class EvaluationWorker(QtCore.QObject):
+    # (node, state) where state is one of STALE, RUNNING, DONE or FAILED
+    nodeStateChanged = QtCore.pyqtSignal(object, str)
+    # emitted when a queued evaluation has been completely processed
+    finished = QtCore.pyqtSignal()
+    # (node, error message)
+    nodeFailed = QtCore.pyqtSignal(object, str)
+
+    def __init__(self, parent=None):
+        super(EvaluationWorker, self).__init__(parent)
+        self._condition = threading.Condition()
+        # every submit/cancel starts a new job; results of older jobs are thrown away
+        self._job = 0
+        # nodes waiting to be evaluated
+        self._pending = []
+        # nodes of the job that is running now, kept until it completes
+        self._running = []
+        # nodes of cancelled jobs, evaluated again by the next submit() or resume()
+        self._held = []
+        # the nodes that changed, for all of the above (see Node.process_nodes);
+        # None when every node has to be recomputed
+        self._roots = set()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='pictograph evaluation', daemon=True)
+        self._thread.start()
+
+    # -------- Called from the GUI thread ---------
+    def submit(self, nodes, roots=None):
+        # evaluate nodes (in topological order), together with any work that was
+        # cancelled or is in progress. Suitable for Node.set_process_handler
+        with self._condition:
+            self._job += 1
+            if roots is None or self._roots is None:
+                self._roots = None
+            else:
+                self._roots = self._roots | set(roots)
+            pending = dict.fromkeys(self._held + self._running + self._pending + list(nodes))
+            self._pending = list(pending)
+            self._held = []
+            self._running = []
+            self._condition.notify()
+        for node in pending:
+            self.nodeStateChanged.emit(node, STALE)
+
+    def cancel(self):
+        # Stop the evaluation in progress (the node that is running finishes, but its
+        # result is discarded) and hold back queued work until the next submit() or
+        # resume(). Call this before changing the graph from the GUI thread.
+        with self._condition:
+            self._job += 1
+            self._held = list(dict.fromkeys(self._held + self._running + self._pending))
+            self._pending = []
+            self._running = []
+
+    def resume(self):
+        # restart whatever cancel() held back
+        with self._condition:
+            held = bool(self._held)
+        if held:
+            self.submit([])
+
+    def is_busy(self):
+        with self._condition:
+            return bool(self._pending or self._running or self._held)
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._job += 1
+            self._condition.notify()
+        self._thread.join()
+
+    # -------- Worker thread ---------
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                job = self._job
+                nodes, self._pending = self._pending, []
+                self._running = nodes
+                roots = self._roots
+            try:
+                completed = self._evaluate(nodes, job, roots)
+            except (RuntimeError, ValueError):
+                # the GUI changed the graph while it was being ordered; the change
+                # comes with a new job that covers these nodes again
+                completed = False
+            if completed:
+                with self._condition:
+                    if self._job == job:
+                        self._running = []
+                        self._roots = set()
+                self.finished.emit()
+
+    def _fail(self, node, job, error):
+        # node raised: clear its output and everything computed from it, which the
+        # loop then skips as their inputs aren't valid. Other branches carry on.
+        # Returns False if the job has been replaced meanwhile
+        with self._condition:
+            if self._job != job:
+                return False
+            stale = downstream_nodes([node])
+            for stale_node in stale:
+                stale_node._clear_output()
+        for stale_node in stale:
+            if stale_node is not node:
+                self.nodeStateChanged.emit(stale_node, STALE)
+        self.nodeStateChanged.emit(node, FAILED)
+        self.nodeFailed.emit(node, str(error))
+        return True
+
+    def _evaluate(self, nodes, job, roots):
+        if any(node._is_async for node in nodes):
+            # an event loop of its own on this thread, so the GUI's is never blocked
+            return asyncio.run(self._evaluate_async(nodes, job, roots))
+        cutoff = None if roots is None else EarlyCutoff(roots)
+        for node in topological_order(nodes):
+            if self._job != job:
+                return False
+            if cutoff is not None and not cutoff.needs_update(node):
+                # none of its inputs changed, so the result it has is still right
+                self.nodeStateChanged.emit(node, DONE)
+                continue
+            if not node._inputs_are_valid():
+                continue
+            was_valid, old_value = node._is_output_valid, _previous_output(node)
+            self.nodeStateChanged.emit(node, RUNNING)
+            key, found, value = node._memo_lookup()
+            if not found:
+                try:
+                    value = node._run_process_core()
+                except Exception as e:
+                    if not self._fail(node, job, e):
+                        return False
+                    continue
+            with self._condition:
+                if self._job != job:
+                    return False
+                node._store_output(value, None if found else key)
+            if cutoff is not None:
+                cutoff.updated(node, not was_valid or old_value is _NOT_COMPARED
+                               or not same_output(node._cutoff, old_value, value))
+            self.nodeStateChanged.emit(node, DONE)
+        return True
+
+    async def _evaluate_async(self, nodes, job, roots):
+        # _evaluate for jobs with async nodes, which wait for their I/O at the same
+        # time. A failing node stops the nodes downstream of it, but not the others
+        cutoff = None if roots is None else EarlyCutoff(roots)
+
+        async def step(node):
+            if self._job != job:
+                raise JobCancelled()
+            if cutoff is not None and not cutoff.needs_update(node):
+                self.nodeStateChanged.emit(node, DONE)
+                return
+            if not node._inputs_are_valid():
+                return
+            was_valid, old_value = node._is_output_valid, _previous_output(node)
+            self.nodeStateChanged.emit(node, RUNNING)
+            key, found, value = node._memo_lookup()
+            if not found:
+                try:
+                    value = await node._run_process_core_async()
+                except Exception as e:
+                    self._fail(node, job, e)
+                    raise
+            with self._condition:
+                if self._job != job:
+                    raise JobCancelled()
+                node._store_output(value, None if found else key)
+            if cutoff is not None:
+                cutoff.updated(node, not was_valid or old_value is _NOT_COMPARED
+                               or not same_output(node._cutoff, old_value, value))
+            self.nodeStateChanged.emit(node, DONE)
+
+        try:
+            await gather_nodes(nodes, step)
+        except Exception:
+            with self._condition:
+                if self._job != job:
+                    return False
+                self._running = []
+        return True
+
+
+class JobCancelled(Exception):
+    # raised inside an evaluation whose job has been replaced by a newer one
+    pass
+
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Run pictographs from the command line, without the GUI. E.g.,
+    python -m pictograph run file.pictograph --set 0.Number=3
+"""
+import argparse
+import itertools
+import sys
+
+from pictograph.Cache import MemoCache, DiskCache, TieredCache
+from pictograph.Graph import Graph, parse_parameter
+from pictograph.Node import set_memo_cache
+from pictograph.Parallel import make_executor, THREAD_EXECUTOR, PROCESS_EXECUTOR
+from pictograph.Profiler import Profiler
+
+
+def parse_assignment(text):
+    # "<glyph id>.<parameter name>=<value>"
+    target, sep, value = text.partition('=')
+    node_id, dot, key = target.partition('.')
+    if not sep or not dot:
+        raise argparse.ArgumentTypeError('expected ID.PARAMETER=VALUE, got "' + text + '"')
+    try:
+        return int(node_id), key, value
+    except ValueError:
+        raise argparse.ArgumentTypeError('the glyph id in "' + text + '" must be an integer')
+
+
+def use_cache_dir(args):
+    if args.cache_dir:
+        set_memo_cache(TieredCache(MemoCache(max_bytes=args.cache_size),
+                                   DiskCache(args.cache_dir, max_bytes=args.cache_size)))
+
+
+def run(args):
+    use_cache_dir(args)
+    if args.compile and args.executor:
+        print('--compile cannot be combined with --executor', file=sys.stderr)
+        return 2
+    labels = {}
+    if args.profile or args.trace:
+        with Profiler() as profiler:
+            status = run_with_executor(args, labels)
+        if args.profile:
+            profiler.save_json(args.profile, labels)
+        if args.trace:
+            profiler.save_chrome_trace(args.trace, labels)
+        print(profiler.format_table(labels), file=sys.stderr)
+        return status
+    return run_with_executor(args, labels)
+
+
+def run_with_executor(args, labels):
+    if args.executor:
+        with make_executor(args.executor, args.workers) as executor:
+            return run_files(args, executor, labels)
+    return run_files(args, None, labels)
+
+
+def run_files(args, executor, labels):
+    # labels collects names for the nodes of every file, for profiling reports
+    status = 0
+    for filename in args.files:
+        try:
+            graph = Graph.load(filename)
+            prefix = filename + ':' if len(args.files) > 1 else ''
+            labels.update((node, prefix + label) for node, label in graph.node_labels().items())
+            for node_id, key, value in args.set:
+                graph.set_parameter_from_string(node_id, key, value)
+            graph.run(executor, compile=args.compile)
+        except Exception as e:
+            # a broken file, or a node that raised; the other files still run
+            print(filename + ': ' + str(e), file=sys.stderr)
+            status = 1
+            continue
+        node_ids = sorted(graph.nodes) if args.all else graph.sinks()
+        for node_id, value in graph.outputs(node_ids).items():
+            print(prefix + str(node_id) + '.' + graph.nodes[node_id].__class__.__name__ + ' = ' + repr(value))
+    return status
+
+
+def parse_values(text):
+    # "<glyph id>.<parameter name>=<value>;<value>;...". Not commas, which separate
+    # the numbers inside "ints" and "Vector" values (e.g. a shape, "3,4")
+    node_id, key, values = parse_assignment(text)
+    return node_id, key, values.split(';')
+
+
+def sweep(args):
+    use_cache_dir(args)
+    try:
+        graph = Graph.load(args.file)
+        targets = []
+        value_lists = []
+        for node_id, key, values in args.vary:
+            parameter = graph.parameter(node_id, key)
+            targets.append((node_id, key))
+            value_lists.append([parse_parameter(parameter, v) for v in values])
+        assignments = (dict(zip(targets, values)) for values in itertools.product(*value_lists))
+        for assignment, outputs in zip(itertools.product(*value_lists),
+                                       graph.sweep(assignments, processes=args.processes, restore=False)):
+            settings = ' '.join(str(i) + '.' + k + '=' + str(v) for (i, k), v in zip(targets, assignment))
+            results = ' '.join(str(i) + '=' + repr(v) for i, v in outputs.items())
+            print(settings + ': ' + results)
+    except Exception as e:
+        print(args.file + ': ' + str(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pictograph')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    run_parser = commands.add_parser('run', help='evaluate pictograph files and print their outputs')
+    run_parser.add_argument('files', nargs='+', metavar='FILE')
+    run_parser.add_argument('--set', action='append', default=[], type=parse_assignment,
+                            metavar='ID.PARAMETER=VALUE', help='override an adjustable parameter')
+    run_parser.add_argument('--all', action='store_true',
+                            help='print the output of every node, not only the unconnected ones')
+    run_parser.add_argument('--executor', choices=[THREAD_EXECUTOR, PROCESS_EXECUTOR],
+                            help='evaluate independent branches in parallel')
+    run_parser.add_argument('--workers', type=int, default=None,
+                            help='number of parallel workers (default: one per core)')
+    run_parser.add_argument('--compile', action='store_true',
+                            help='fuse chains of arithmetic nodes into single expressions')
+    run_parser.add_argument('--profile', metavar='FILE',
+                            help='time every node, print a summary and save it to FILE as JSON')
+    run_parser.add_argument('--trace', metavar='FILE',
+                            help='save the timing of every node to FILE as a Chrome trace (chrome://tracing)')
+    run_parser.set_defaults(func=run)
+    sweep_parser = commands.add_parser('sweep', help='evaluate a pictograph for every combination of parameter values')
+    sweep_parser.add_argument('file', metavar='FILE')
+    sweep_parser.add_argument('--vary', action='append', default=[], type=parse_values,
+                              metavar='ID.PARAMETER=V1;V2;...', help='values to try for an adjustable parameter')
+    sweep_parser.add_argument('--processes', type=int, default=None,
+                              help='split the runs across this many worker processes')
+    sweep_parser.set_defaults(func=sweep)
+    for p in [run_parser, sweep_parser]:
+        p.add_argument('--cache-dir', metavar='DIR',
+                       help='keep node results in DIR and reuse them on later runs')
+        p.add_argument('--cache-size', type=int, default=None, metavar='BYTES',
+                       help='limit the size of the result cache')
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,13 @@
 from pictograph.Node import Node, AdjustableParameter
-from PyQt5 import QtCore, QtWidgets, QtGui
 
 
 class MultiplicationNode(Node):
+    __slots__ = ()
+    displayName = "Multiply"
+    description = "Multiplies two input values"
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Multiply"
-        self.description = "Multiplies two input values"
         self._input_terminals = {"arg1": None, "arg2": None}
     
     def _process_core(self):
@@ -14,10 +15,12 @@ class MultiplicationNode(Node):
 
 
 class AnotherNumberNode(Node):
+    __slots__ = ()
+    displayName = "Number"
+    description = "A constant numerical value"
+
     def __init__(self, the_value=0):
         super().__init__()
-        self.displayName = "Number"
-        self.description = "A constant numerical value"
         self._adjustable_parameters = {'Number': AdjustableParameter(name="Number", type="double", val=the_value)}
         self._output_data_cache = self._adjustable_parameters['Number']._value
         self._is_output_valid = True
@@ -27,6 +30,8 @@ class AnotherNumberNode(Node):
         return self._output_data_cache
 
     def as_widget(self):
+        # imported here so the node can be used without Qt
+        from PyQt5 import QtCore, QtWidgets, QtGui
         locale = QtCore.QLocale()
         labelWidget = QtWidgets.QLabel("Set the number:")
         w = QtWidgets.QLineEdit()
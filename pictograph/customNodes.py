@@ -1,22 +1,61 @@
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pictograph.Compiler import ELEMENTWISE_OPS
 from pictograph.Node import Node, AdjustableParameter
+from pictograph.Streaming import elementwise
+
+
+def arithmetic(node, a, b):
+    # node._elementwise_op applied to a and b. Arrays are computed with the ufunc
+    # into node's output buffer (see Node._output_buffer), so that evaluating again
+    # with the same shapes allocates nothing
+    function, ufunc_name, _ = ELEMENTWISE_OPS[node._elementwise_op]
+    if np is None or not (type(a) is np.ndarray or type(b) is np.ndarray):
+        return function(a, b)
+    if not (_plain_numeric(a) and _plain_numeric(b)):
+        return function(a, b)
+    out = node._output_buffer(np.broadcast_shapes(np.shape(a), np.shape(b)), np.result_type(a, b))
+    return getattr(np, ufunc_name)(a, b, out=out)
+
+
+def _plain_numeric(value):
+    if type(value) is np.ndarray:
+        return value.dtype.kind in 'biufc'
+    return isinstance(value, (int, float, complex, np.number))
 
 
 class AdditionNode(Node):
+    __slots__ = ()
+    displayName = "Add"
+    description = "Adds two input values"
+
+    # lets Compiler fuse chains of arithmetic nodes
+    _elementwise_op = "add"
+    _reuse_output = True
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Add"
-        self.description = "Adds two input values"
         self._input_terminals = {"arg1": None, "arg2": None}
     
     def _process_core(self):
-        return self.arg1 + self.arg2
+        return arithmetic(self, self.arg1, self.arg2)
+
+    def _process_stream(self):
+        return elementwise(operator.add, self.arg1, self.arg2)
 
 
 class NumberNode(Node):
+    __slots__ = ()
+    displayName = "Number"
+    description = "A constant numerical value"
+
     def __init__(self, the_value=0):
         super().__init__()
-        self.displayName = "Number"
-        self.description = "A constant numerical value"
         self._adjustable_parameters = {'Number': AdjustableParameter(name="Number", type="double", val=the_value)}
         self._output_data_cache = self._adjustable_parameters['Number']._value
         self._is_output_valid = True
@@ -27,10 +66,12 @@ class NumberNode(Node):
 
 
 class IntegerNode(Node):
+    __slots__ = ()
+    displayName = "Integer"
+    description = "A constant integer"
+
     def __init__(self, the_value=0):
         super().__init__()
-        self.displayName = "Integer"
-        self.description = "A constant integer"
         self._adjustable_parameters = {"Integer": AdjustableParameter(name="Integer", type="int", val=the_value)}
         self._output_data_cache = self._adjustable_parameters["Integer"]._value
         self._is_output_valid = True
@@ -41,21 +82,24 @@ class IntegerNode(Node):
 
 
 class PrinterNode(Node):
+    __slots__ = ()
+    displayName = "Print"
+    description = "A printer, with no output values"
+    _has_output = False
+    _memoize = False
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Print"
-        self.description = "A printer, with no output values"
         self._output_data_cache = None
         self._is_output_valid = False
         self._input_terminals = {"arg1":None}
-        self._has_output = False
         
     def _process_core(self):
         print('Node value changed to "' + str(self.arg1) + '"')
         return None
 
-    def _invalidate_output(self):
-        super()._invalidate_output()
+    def _clear_output(self):
+        super()._clear_output()
         print( 'Node output became invalid' )
     
     def connect_output(self, the_node):
@@ -63,31 +107,49 @@ class PrinterNode(Node):
 
 
 class SubtractionNode(Node):
+    __slots__ = ()
+    displayName = "Subtract"
+    description = "Subtracts two input values"
+
+    _elementwise_op = "subtract"
+    _reuse_output = True
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Subtract"
-        self.description = "Subtracts two input values"
         self._input_terminals = {"arg1":None, "arg2":None}
     
     def _process_core(self):
-        return self.arg1 - self.arg2
+        return arithmetic(self, self.arg1, self.arg2)
+
+    def _process_stream(self):
+        return elementwise(operator.sub, self.arg1, self.arg2)
 
 
 class MultiplicationNode(Node):
+    __slots__ = ()
+    displayName = "Multiply"
+    description = "Multiplies two input values"
+
+    _elementwise_op = "multiply"
+    _reuse_output = True
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Multiply"
-        self.description = "Multiplies two input values"
         self._input_terminals = {"arg1":None, "arg2":None}
     
     def _process_core(self):
-        return self.arg1 * self.arg2
+        return arithmetic(self, self.arg1, self.arg2)
+
+    def _process_stream(self):
+        return elementwise(operator.mul, self.arg1, self.arg2)
 
 
 class StringNode(Node):
+    __slots__ = ()
+    displayName = "String"
+
     def __init__(self, the_value=""):
         super().__init__()
-        self.displayName = "String"
         self._adjustable_parameters = {"String": AdjustableParameter(name="String", type="string", val=the_value)}
         self._output_data_cache = self._adjustable_parameters["String"]._value
         self._is_output_valid = True
@@ -98,10 +160,12 @@ class StringNode(Node):
 
 
 class StringFormatNode(Node):
+    __slots__ = ()
+    displayName = "Format"
+    description = "Format a string"
+
     def __init__(self):
         super().__init__()
-        self.displayName = "Format"
-        self.description = "Format a string"
         self._input_terminals = {"arg1": None, "arg2": None}
     
     def _process_core(self):
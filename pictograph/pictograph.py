@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import sys
 import os
+import math
 
 from PyQt5.QtWidgets import QGraphicsScene
 from PyQt5.QtWidgets import QGraphicsView
@@ -10,9 +11,19 @@ from PyQt5.QtWidgets import QWidget
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from pictograph.Node import *
-import importlib.util
+from pictograph.Graph import ItemIndex, parse_parameter, format_parameter, restore_outputs, saved_outputs
+from pictograph.Registry import node_registry
+from pictograph.Archive import ARCHIVE_EXTENSION, is_archive, load_archive, save_archive
+from pictograph.Cache import MemoCache, DiskCache, TieredCache
+from pictograph.Profiler import Profiler
+from pictograph.Updates import ParameterUpdateQueue
+from pictograph.Worker import EvaluationWorker, STALE, RUNNING, DONE, FAILED
 import json
 
+# size limits of the output caches used with Edit → Cache Results on Disk
+MEMORY_CACHE_BYTES = 1 << 28
+DISK_CACHE_BYTES = 1 << 32
+
 
 class MainWindow(QMainWindow):
 
@@ -34,6 +45,7 @@ class MainWindow(QMainWindow):
         self.view.setDragMode(QGraphicsView.RubberBandDrag)
         self.view.setScene(self.scene)
         self.view.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.view.setCacheMode(QGraphicsView.CacheBackground)
         self.layout_container.addWidget(self.view)
         
         # set up menu/toolbar actions
@@ -62,6 +74,14 @@ class MainWindow(QMainWindow):
         loadGlyphsAction.setShortcut('Ctrl+L')
         loadGlyphsAction.triggered.connect(self.loadGlyphLibrary)
 
+        heatMapAction = QtWidgets.QAction('Profile Heat Map', self)
+        heatMapAction.setCheckable(True)
+        heatMapAction.toggled.connect(self.setHeatMapVisible)
+
+        diskCacheAction = QtWidgets.QAction('Cache Results on Disk', self)
+        diskCacheAction.setCheckable(True)
+        diskCacheAction.toggled.connect(self.setDiskCacheEnabled)
+
         # set up the menubar
         menubar = self.menuBar()
         fileMenu = menubar.addMenu('&File')
@@ -75,6 +95,10 @@ class MainWindow(QMainWindow):
         fileMenu.addAction(loadGlyphsAction)
         editMenu = menubar.addMenu('&Edit')
         editMenu.addAction(deleteItemsAction)
+        editMenu.addSeparator()
+        editMenu.addAction(diskCacheAction)
+        viewMenu = menubar.addMenu('&View')
+        viewMenu.addAction(heatMapAction)
 
         # set up the toolbar
         self.toolbar = self.addToolBar('Exit')
@@ -111,30 +135,81 @@ class MainWindow(QMainWindow):
         # set up the node editor
         self.nodeEditor = NodeEditor(parent = self)
         self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.nodeEditor)
+
+        # evaluate nodes on a background thread, so slow nodes don't freeze the window
+        self.evaluationWorker = EvaluationWorker(self)
+        self.evaluationWorker.nodeStateChanged.connect(self.scene.setNodeState)
+        self.evaluationWorker.nodeFailed.connect(lambda node, message: print(node.displayName + ' failed: ' + message))
+        self.evaluationWorker.finished.connect(self.nodeEditor.refresh)
+        self.evaluationWorker.finished.connect(self.updateHeatMap)
+        set_process_handler(self.evaluationWorker.submit)
+
+        # per-node timing, only while the heat map is shown
+        self.profiler = None
+
+        # the disk cache stays on between sessions once it has been turned on
+        self.settings = QtCore.QSettings('pictograph', 'pictograph')
+        diskCacheAction.setChecked(self.settings.value('diskCache', False, type=bool))
+
+    def setHeatMapVisible(self, flag):
+        # color every glyph by the time its node has spent processing
+        if flag:
+            self.profiler = Profiler()
+            set_profiler(self.profiler)
+        else:
+            set_profiler(None)
+            self.profiler = None
+        self.updateHeatMap()
+
+    def updateHeatMap(self):
+        self.scene.showHeat(self.profiler)
+
+    def setDiskCacheEnabled(self, flag):
+        # keep node outputs in a per-user directory, so that they are still there in
+        # the next session (like --cache-dir on the command line)
+        if flag:
+            directory = os.path.join(QtCore.QStandardPaths.writableLocation(
+                QtCore.QStandardPaths.GenericCacheLocation), 'pictograph')
+            set_memo_cache(TieredCache(MemoCache(max_bytes=MEMORY_CACHE_BYTES),
+                                       DiskCache(directory, max_bytes=DISK_CACHE_BYTES)))
+        else:
+            set_memo_cache(None)
+        self.settings.setValue('diskCache', flag)
+
+    def closeEvent(self, event):
+        set_process_handler(None)
+        set_profiler(None)
+        set_memo_cache(None)
+        self.evaluationWorker.stop()
+        super(MainWindow, self).closeEvent(event)
         
     def savePictograph(self):
         # save glyphs
+        glyphs = self.scene.glyphs
         glyph_list = []
         encoder = GlyphEncoder()
-        for i,g in enumerate(self.scene.glyphs):
+        for g in glyphs:
             d = encoder.default(g)
-            d['id'] = i
+            d['id'] = glyphs.id_of(g)
             glyph_list.append(d)
         # save connections
         connection_list = []
-        for i,c in enumerate(self.scene.connections):
-            d = {'id': i}
-            d['startGlyph'] = self.scene.glyphs.index(c.startAnchor.parent)
-            d['endGlyph'] = self.scene.glyphs.index(c.endAnchor.parent)
+        for c in self.scene.connections:
+            d = {'id': self.scene.connections.id_of(c)}
+            d['startGlyph'] = glyphs.id_of(c.startAnchor.parent)
+            d['endGlyph'] = glyphs.id_of(c.endAnchor.parent)
             d['endGlyphKey'] = c.endAnchor.nodeKey
             connection_list.append(d)
         the_file = {'glyphs': glyph_list, 'connections': connection_list}
         # print(json.dumps(the_file, sort_keys=True, indent=4))
 
         options = QtWidgets.QFileDialog.Options()
-        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self,"Save As","","All Files (*);;Pictograph Files (*.pictograph)", options=options)
+        filename, _ = QtWidgets.QFileDialog.getSaveFileName(self,"Save As","","All Files (*);;Pictograph Files (*.pictograph);;Pictograph Archives (*.pictographz)", options=options)
         # todo, update this to do the normal save/save as behavior
-        if filename:
+        if filename.endswith(ARCHIVE_EXTENSION):
+            # binary archive, which can also hold array parameters and the array outputs
+            save_archive(filename, the_file, saved_outputs({glyphs.id_of(g): g.node for g in glyphs}))
+        elif filename:
             with open(filename, 'w') as f:    # use x so that fails if file exists
                 print(json.dumps(the_file, sort_keys=True, indent=4), file=f)
     
@@ -143,28 +218,38 @@ class MainWindow(QMainWindow):
 
     def openPictograph(self):
         options = QtWidgets.QFileDialog.Options()
-        filename, _ = QtWidgets.QFileDialog.getOpenFileName(self,"Select Pictograph", "","All Files (*);;Pictograph Files (*.pictograph)", options=options)
+        filename, _ = QtWidgets.QFileDialog.getOpenFileName(self,"Select Pictograph", "","All Files (*);;Pictograph Files (*.pictograph *.pictographz)", options=options)
         if filename:
             # TODO: 
             # if this window is empty, open here
             # otherwise make a new window and open there
             # Change try/catch to read entire file before adding any to scene
             try:
-                with open(filename, 'r') as f:
-                    d = json.loads(''.join(f.readlines()))
-                    if not 'glyphs' in d:
-                        return
-                    if not 'connections' in d:
-                        return
+                outputs = {}
+                if is_archive(filename):
+                    # array parameters and outputs come back memory-mapped
+                    d, outputs = load_archive(filename)
+                else:
+                    with open(filename, 'r') as f:
+                        d = json.loads(''.join(f.readlines()))
+                if not 'glyphs' in d:
+                    return
+                if not 'connections' in d:
+                    return
+                glyphsById = {}
+                # evaluate the whole pictograph once, after everything is connected
+                with batch() as pending:
                     for g in d['glyphs']:
-                        obj = self.scene.addGlyphFromDict(g)
-                        g['obj'] = obj
+                        glyphsById[g['id']] = self.scene.addGlyphFromDict(g)
                     for c in d['connections']:
-                        i = [g['obj'] for g in d['glyphs'] if g['id'] == c['startGlyph']][0]
-                        j = [g['obj'] for g in d['glyphs'] if g['id'] == c['endGlyph']][0]
+                        i = glyphsById[c['startGlyph']]
+                        j = glyphsById[c['endGlyph']]
                         startAnchor = i.outputAnchor
                         endAnchor = j.inputAnchors[j.inputAnchorNames.index(c['endGlyphKey'])]
                         self.scene.connectAnchors(startAnchor, endAnchor)
+                    # saved outputs that are still up to date need not be computed again
+                    if outputs:
+                        pending.discard(restore_outputs({i: g.node for i, g in glyphsById.items()}, outputs))
             except:
                 print('there was some error loading the file')
     
@@ -182,42 +267,39 @@ class MainWindow(QMainWindow):
             self.loadGlyphModules(mod_name[0], filename)
         
     def loadGlyphModules(self, mod_name, path=None):
-        if path:
-            spec = importlib.util.spec_from_file_location(mod_name, path)
-            if spec is None:
-                print("can't find the module " + mod_name)
-            else:
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-        else:
-            spec = importlib.util.find_spec(mod_name)
-            if spec is None:
-                print("can't find the module " + mod_name)
-            else:
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-
-        def check_mod(m_name):
-            m = module.__dict__[m_name]
-            return (isinstance(m, type) and
-                    issubclass(m, Node) and
-                    not m == Node)
-
-        node_list = [m for m in dir(module) if check_mod(m)]
+        # modules are imported once, through the registry shared with the file loaders
+        try:
+            node_classes = node_registry.node_classes(mod_name, path)
+        except ValueError:
+            print("can't find the module " + mod_name)
+            return
 
-        for name in node_list:
+        for name, nodeClass in node_classes.items():
             if self.nodeSelector.findItems(name, QtCore.Qt.MatchExactly):
                 print('A node type named ' + name + ' has already been loaded. Loading aborted.')
             else:
                 w = QtWidgets.QListWidgetItem(name)
-                w.nodeClass = module.__dict__[name]
+                w.nodeClass = nodeClass
                 self.nodeSelector.addItem(w)
 
 
 class NodeEditor(QtWidgets.QDockWidget):
+    # milliseconds to wait after the last edit before evaluating
+    defaultDebounceInterval = 300
+
     def __init__(self, parent):
         super(NodeEditor, self).__init__("Node Editor", parent)
-        
+
+        # edits are queued and only the last value of a burst is evaluated, either
+        # after the debounce interval or (in commit mode) on Enter/focus out
+        self.updateQueue = ParameterUpdateQueue()
+        self.commitMode = False
+        self.debounceTimer = QtCore.QTimer(self)
+        self.debounceTimer.setSingleShot(True)
+        self.debounceTimer.setInterval(self.defaultDebounceInterval)
+        self.debounceTimer.timeout.connect(self.commitParameters)
+        self.currentNode = None
+
         gb = QtWidgets.QWidget()
         self.nodeEditorGroup = QVBoxLayout()
         gb.setLayout(self.nodeEditorGroup)
@@ -225,7 +307,38 @@ class NodeEditor(QtWidgets.QDockWidget):
         self.setAllowedAreas(QtCore.Qt.LeftDockWidgetArea | QtCore.Qt.RightDockWidgetArea)
         self.setWidget(gb)
         
+    def setDebounceInterval(self, msec):
+        self.debounceTimer.setInterval(msec)
+
+    def setCommitMode(self, flag):
+        # True: only evaluate when editing is finished (Enter or focus out)
+        self.commitMode = flag
+
+    def queueParameter(self, node, key, value):
+        self.updateQueue.submit(node, key, value)
+        if not self.commitMode:
+            self.debounceTimer.start()
+
+    def commitParameters(self):
+        self.debounceTimer.stop()
+        if self.updateQueue.has_pending():
+            # a newer value replaces whatever is being evaluated now
+            self.parent().evaluationWorker.cancel()
+            self.updateQueue.flush()
+            # in lazy mode nothing computes the edited node unless it is asked for
+            if self.currentNode is not None:
+                request_evaluation([self.currentNode])
+            self.refresh()
+
+    def refresh(self):
+        # show the current output of the node being edited
+        if self.currentNode is not None:
+            self.textBox.setText(self.currentNode.displayName + ": " + self.currentNode._output_data_cache.__repr__())
+
     def clear(self):
+        # don't lose edits that are still waiting for the timer
+        self.commitParameters()
+        self.currentNode = None
         ng = self.nodeEditorGroup
         while ng.count():
             child = ng.takeAt(0)
@@ -237,6 +350,9 @@ class NodeEditor(QtWidgets.QDockWidget):
         self.textBox = QtWidgets.QTextEdit()
         self.textBox.setText(node.displayName + ": " +  node._output_data_cache.__repr__())
         self.nodeEditorGroup.addWidget(self.textBox)
+        self.currentNode = node
+        # pull the value if it is stale; refresh() shows it when the worker is done
+        request_evaluation([node])
 
         self.addWidgetsForNode(node)
 
@@ -258,20 +374,41 @@ class NodeEditor(QtWidgets.QDockWidget):
         node._adjust_parameter(key, value)
         self.textBox.setText(node.displayName + ": " +  node._output_data_cache.__repr__())
     
+    def queueParsedParameter(self, node, p, text):
+        # text that doesn't parse (yet) is ignored until it does
+        try:
+            value = parse_parameter(p, text)
+        except ValueError:
+            return
+        self.queueParameter(node, p.name, value)
+
     def parameter_as_widgets(self, p, node):
         locale = QtCore.QLocale()
         labelWidget = QtWidgets.QLabel(p.name)
+        if p.type == "options":
+            # picking an item is a finished edit, even in commit mode
+            w = QtWidgets.QComboBox()
+            w.addItems(list(p.values))
+            w.setCurrentText(str(p._value))
+            w.currentTextChanged.connect(lambda val: self.queueParameter(node, p.name, val))
+            w.activated.connect(lambda index: self.commitParameters())
+            return labelWidget, w
         w = QtWidgets.QLineEdit()
-        w.setText(str(p._value))
+        w.setText(format_parameter(p))
         if p.type == "string":
             # validate strings?
-            w.textChanged.connect(lambda val: node._adjust_parameter(p.name, val) )
+            w.textChanged.connect(lambda val: self.queueParameter(node, p.name, val) )
         elif p.type == "double":
             w.setValidator(QtGui.QDoubleValidator(-1e-15, 1e15, 10, w))
-            w.textChanged.connect(lambda val: node._adjust_parameter(p.name, locale.toDouble(val)[0]) )
+            w.textChanged.connect(lambda val: self.queueParameter(node, p.name, locale.toDouble(val)[0]) )
         elif p.type == "int":
             w.setValidator(QtGui.QIntValidator(w))
-            w.textChanged.connect(lambda val: node._adjust_parameter(p.name, locale.toInt(val)[0]) )
+            w.textChanged.connect(lambda val: self.queueParameter(node, p.name, locale.toInt(val)[0]) )
+        elif p.type in ["ints", "Vector"]:
+            # comma separated numbers, e.g. a shape
+            w.setPlaceholderText("e.g. 3, 4")
+            w.textChanged.connect(lambda val: self.queueParsedParameter(node, p, val))
+        w.editingFinished.connect(self.commitParameters)
 
         editWidget = w
         return labelWidget, editWidget
@@ -295,26 +432,24 @@ class PictoScene(QGraphicsScene):
         # TODO: refactor so glyphs+connections is the model. This
         # will allow things like load/save files to happen separate
         # from the GUI. 
-        self.glyphs = []
-        self.connections = []
+        # Both are indexed, so add/remove/lookup by id are O(1) on big graphs
+        self.glyphs = ItemIndex()
+        self.connections = ItemIndex()
+        self.glyphForNode = {}
         
         self.activeAnchor = None
         self.activeConnection = None
 
+        # draw the background from cached pixmap tiles instead of vector lines
+        self.cacheBackgroundTiles = False
+        self.makeBackgroundBrushes()
+
     def addGlyphFromDict(self, d):
         # create a glyph from the dict d, and add it to the scene
         pos = QtCore.QPointF(d['Position']['x'], d['Position']['y'])
-        mod_name = d['node_module']
-
-        spec = importlib.util.find_spec('pictograph.' + mod_name)
-        if spec is None:
-            print("can't find the module " + mod_name)
-        else:
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-        if d['node_class'] in module.__dict__:
-            nodeType = module.__dict__[d['node_class']]
-        else:
+        try:
+            nodeType = node_registry.find(d['node_module'], d['node_class'])
+        except ValueError:
             print('class not found... abort file load.')
             # TODO: somehow do the file abort??
             return
@@ -326,7 +461,33 @@ class PictoScene(QGraphicsScene):
         self.addItem(g)
         return g
 
+    def setNodeState(self, node, state):
+        # called (through a queued signal) by the evaluation worker
+        g = self.glyphForNode.get(node)
+        if g is not None:
+            g.setState(state)
+
+    def showHeat(self, profiler):
+        # profiler is None to go back to the normal colors
+        heat = profiler.heat() if profiler is not None else {}
+        stats = profiler.stats if profiler is not None else {}
+        for g in self.glyphs:
+            s = stats.get(g.node)
+            if s is None:
+                g.setHeat(None if profiler is None else 0.0, '')
+            else:
+                g.setHeat(heat.get(g.node, 0.0),
+                          '{} calls, {:.3f} ms total, {:.3f} ms last, {} cache hits'.format(
+                              s.calls, s.total_time * 1000, s.last_time * 1000, s.cache_hits))
+
     def deleteItems(self):
+        worker = self.parent().evaluationWorker
+        worker.cancel()
+        with batch():
+            self._deleteItems()
+        worker.resume()
+
+    def _deleteItems(self):
         # delete connection if one is active
         if self.activeConnection:
             c = self.activeConnection
@@ -341,39 +502,80 @@ class PictoScene(QGraphicsScene):
                 clist = item.removeConnections()
                 self.removeItem(item)
                 self.glyphs.remove(item)
+                del self.glyphForNode[item.node]
                 for c in clist:
                     connections.append(c)
                 
-            conections = set(connections)
             for c in connections:
                 self.connections.remove(c)
                 self.removeItem(c)
         
+    # size of a grid cell, and of the pixmap tiles used when cacheBackgroundTiles is on
+    gridSize = 20
+    tileSize = 200
+    gradientHeight = 500
+
     def drawBackground(self, painter, rect):
-        # TODO: still need to figure out how to redraw this when nodes move and when the view scrolls
-        # also, this needs to have the gradient height based on window size, instead of fixed at 500
-        gradient = QtGui.QLinearGradient(0, 0, 0, 500)
+        # Only the exposed rect is painted. The pen and brush are made once, in
+        # makeBackgroundBrushes, and the grid lines go to the painter in one call.
+        # TODO: this needs to have the gradient height based on window size, instead of fixed at 500
+        if self.cacheBackgroundTiles:
+            self.drawBackgroundTiles(painter, rect)
+            return
+        painter.fillRect(rect, self.backgroundBrush)
+        painter.setPen(self.gridPen)
+        painter.drawLines(self.gridLines(rect))
+
+    def makeBackgroundBrushes(self):
+        gradient = QtGui.QLinearGradient(0, 0, 0, self.gradientHeight)
         gradient.setColorAt(0.0, QtGui.QColor(117, 213, 255))
         gradient.setColorAt(1.0, QtGui.QColor(5, 131, 255))
-        painter.fillRect(rect, QtGui.QBrush(gradient))
-
-        gridsize = 20
-        # really need to only draw within rect
-        y0 = -250*gridsize
-        x0 = -250*gridsize
-        y1 = 250*gridsize
-        x1 = 250*gridsize
-        for y in range(500):
-            painter.setPen(QtGui.QPen(QtGui.QColor(0,64,141), 1))
-            painter.drawLine(x0, y0 + y*gridsize, x1, y0 + y*gridsize)
-        for x in range(500):
-            painter.setPen(QtGui.QPen(QtGui.QColor(0,64,141), 1))
-            painter.drawLine(x0 + x*gridsize, y0, x0 + x*gridsize, y1)
-        
-        
+        self.backgroundBrush = QtGui.QBrush(gradient)
+        self.gridPen = QtGui.QPen(QtGui.QColor(0,64,141), 1)
+        # tile row -> pixmap (see drawBackgroundTiles)
+        self.backgroundTiles = {}
+
+    def gridLines(self, rect):
+        g = self.gridSize
+        x0 = int(math.floor(rect.left() / g)) * g
+        y0 = int(math.floor(rect.top() / g)) * g
+        lines = [QtCore.QLineF(x, rect.top(), x, rect.bottom())
+                 for x in range(x0, int(math.ceil(rect.right())) + 1, g)]
+        lines += [QtCore.QLineF(rect.left(), y, rect.right(), y)
+                  for y in range(y0, int(math.ceil(rect.bottom())) + 1, g)]
+        return lines
+
+    def backgroundTile(self, row):
+        # The background only changes along y, and only between 0 and gradientHeight,
+        # so every row of tiles above (or below) that band looks the same
+        lastRow = int(math.ceil(self.gradientHeight / self.tileSize))
+        row = min(max(row, -1), lastRow)
+        if row not in self.backgroundTiles:
+            t = self.tileSize
+            pixmap = QtGui.QPixmap(t, t)
+            p = QtGui.QPainter(pixmap)
+            p.translate(0, -row * t)
+            tileRect = QtCore.QRectF(0, row * t, t, t)
+            p.fillRect(tileRect, self.backgroundBrush)
+            p.setPen(self.gridPen)
+            p.drawLines(self.gridLines(tileRect))
+            p.end()
+            self.backgroundTiles[row] = pixmap
+        return self.backgroundTiles[row]
+
+    def drawBackgroundTiles(self, painter, rect):
+        t = self.tileSize
+        for row in range(int(math.floor(rect.top() / t)), int(math.ceil(rect.bottom() / t))):
+            top = max(rect.top(), row * t)
+            bottom = min(rect.bottom(), (row + 1) * t)
+            target = QtCore.QRectF(rect.left(), top, rect.width(), bottom - top)
+            offset = QtCore.QPointF(rect.left() % t, top - row * t)
+            painter.drawTiledPixmap(target, self.backgroundTile(row), offset)
+
     def addItem(self, item):
         if isinstance(item, PictoGlyph):
             self.glyphs.append(item)
+            self.glyphForNode[item.node] = item
         elif isinstance(item, PictoConnection):
             self.connections.append(item)
         super(PictoScene, self).addItem(item)
@@ -435,24 +637,36 @@ class PictoScene(QGraphicsScene):
         if "output" not in [a1.nodeKey, a2.nodeKey]:
             print('Cannot connect inputs to each other')
             return
-        # TODO: need to check that the input is not already connected
-        
+        if a1.nodeKey == "output":
+            outputAnchor, inputAnchor = a1, a2
+        else:
+            outputAnchor, inputAnchor = a2, a1
+        inputNode = inputAnchor.parentItem().node
+        if inputNode._input_terminals[inputAnchor.nodeKey] is not None:
+            print('That input is already connected')
+            return
+
+        # connecting changes the graph under the evaluation worker
+        self.parent().evaluationWorker.cancel()
+        try:
+            # rejects connections that would make a cycle, before anything is computed
+            inputNode.connect_input(inputAnchor.nodeKey, outputAnchor.parentItem().node)
+        except ValueError as e:
+            print(e)
+            return
+        finally:
+            self.parent().evaluationWorker.resume()
         c = PictoConnection(a1, a2)
         self.addItem(c)
         a1.parentItem().addConnection(c)
         a2.parentItem().addConnection(c)
-        if a1.nodeKey == "output":
-            a1.parentItem().node.connect_output(a2.parentItem().node)
-            a2.parentItem().node.connect_input(a2.nodeKey, a1.parentItem().node)
-        else:
-            a2.parentItem().node.connect_output(a1.parentItem().node)
-            a1.parentItem().node.connect_input(a1.nodeKey, a2.parentItem().node)
-            
+
 
 class PictoGlyph(QtWidgets.QGraphicsItem):
     def __init__(self, eventPos, nodeType):
         super(PictoGlyph, self).__init__()
-        self.connections = []
+        # adjacency: the connections attached to this glyph
+        self.connections = ItemIndex()
         self.rect = QtCore.QRectF(0, 0, 60, 80)
         rect = self.rect
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, True)
@@ -484,10 +698,31 @@ class PictoGlyph(QtWidgets.QGraphicsItem):
 
         self.backgroundColor = QtGui.QColor(10, 123, 255)
         self.highlightColor = QtGui.QColor(0, 44, 106)
-    
+        self.state = DONE if self.node.is_output_valid() else STALE
+        # fraction of the slowest node's processing time, while the heat map is on
+        self.heat = None
+
+    # colors of the small evaluation-state light in the title bar
+    stateColors = {STALE: QtGui.QColor(200, 200, 200),
+                   RUNNING: QtGui.QColor(255, 170, 0),
+                   DONE: QtGui.QColor(60, 200, 80),
+                   FAILED: QtGui.QColor(230, 30, 30)}
+
+    def setState(self, state):
+        self.state = state
+        self.update()
+
+    def setHeat(self, heat, toolTip):
+        self.heat = heat
+        self.setToolTip(toolTip)
+        self.update()
+
+    def heatColor(self):
+        # blue for idle nodes through to red for the slowest
+        return QtGui.QColor.fromHsvF((1 - self.heat) * 0.66, 0.8, 1.0)
+
     def removeConnection(self, connection):
-        #self.connecttions = [c for c in self.connections if c is not connection]
-        if connection in self.connections: self.connections.remove(connection)
+        self.connections.discard(connection)
         
     def removeConnections(self):
         clist = self.connections.copy()
@@ -505,18 +740,22 @@ class PictoGlyph(QtWidgets.QGraphicsItem):
         return r
 
     def paint(self, painter, opt, w):
-        painter.setBrush(self.backgroundColor)
+        painter.setBrush(self.backgroundColor if self.heat is None else self.heatColor())
         painter.setPen(QtGui.QPen(self.highlightColor, 2))
         painter.drawRoundedRect(self.rect, 5, 5)
         
         painter.setPen(QtGui.QPen(self.highlightColor, 2))
         painter.setBrush(self.highlightColor)
         y = self.rect.height()/5
-        painter.drawLine(0, y, self.rect.width(), y)
-        painter.drawRoundedRect(0, 0, self.rect.width(), y, 5, 5)
+        painter.drawLine(QtCore.QLineF(0, y, self.rect.width(), y))
+        painter.drawRoundedRect(QtCore.QRectF(0, 0, self.rect.width(), y), 5, 5)
 
         painter.setPen(QtGui.QPen(QtCore.Qt.white, 2))
         painter.drawText(self.boundingRect(), self.displayName)
+
+        painter.setPen(QtGui.QPen(self.highlightColor, 1))
+        painter.setBrush(self.stateColors[self.state])
+        painter.drawEllipse(QtCore.QPointF(self.rect.width() - y/2, y/2), y/4, y/4)
         
         if self.isSelected():
             painter.setBrush(QtCore.Qt.NoBrush)
@@ -558,8 +797,8 @@ class PictoAnchor(QtWidgets.QGraphicsItem):
     def paint(self, painter, opt, w):
         painter.setBrush(self.backgroundColor)
         painter.setPen(QtGui.QPen(self.highlightColor, 0))
-        painter.drawRoundedRect(self.upperLeft.x(), self.upperLeft.y(), 
-            self.size, self.size, 0,0)
+        painter.drawRoundedRect(QtCore.QRectF(self.upperLeft.x(), self.upperLeft.y(),
+            self.size, self.size), 0,0)
         if self.isActiveAnchor:
             painter.setPen(QtGui.QPen(QtCore.Qt.red, 1, QtCore.Qt.SolidLine))
             painter.drawRect(self.boundingRect())
@@ -0,0 +1,17 @@
+# Nodes shared by several test modules
+from .context import pictograph
+from pictograph import customNodes
+
+
+class CountingAdditionNode(customNodes.AdditionNode):
+    # counts its evaluations: count for this node, total for all of them
+    total = 0
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def _process_core(self):
+        self.count += 1
+        CountingAdditionNode.total += 1
+        return super()._process_core()
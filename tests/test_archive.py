@@ -0,0 +1,113 @@
+import tracemalloc
+
+import pytest
+
+from .context import pictograph
+from .nodes import CountingAdditionNode
+from pictograph import customNodes
+from pictograph.Graph import Graph
+from pictograph.Archive import load_archive
+
+np = pytest.importorskip('numpy')
+from pictograph.NumpyNodes import FullNode, npVectorNode
+
+
+def vector_graph():
+    g = Graph()
+    v = g.add_node(npVectorNode(np.arange(1000.0)))
+    add = g.add_node(CountingAdditionNode())
+    g.connect(v, add, 'arg1')
+    g.connect(v, add, 'arg2')
+    g.run()
+    return g
+
+
+def test_arrays_are_memory_mapped(tmp_path):
+    filename = str(tmp_path / 'vector.pictographz')
+    vector_graph().save(filename)
+    g = Graph.load(filename)
+    vector = g.nodes[0]._adjustable_parameters['Vector']._value
+    assert isinstance(vector, np.memmap)
+    assert not vector.flags.writeable
+    g.run()
+    assert (g.outputs()[1] == 2 * np.arange(1000.0)).all()
+
+
+def test_loading_does_not_read_arrays_into_memory(tmp_path):
+    filename = str(tmp_path / 'vector.pictographz')
+    g = Graph()
+    v = g.add_node(npVectorNode(np.ones(1000000)))
+    add = g.add_node(customNodes.AdditionNode())
+    g.connect(v, add, 'arg1')
+    g.connect(v, add, 'arg2')
+    g.run()
+    g.save(filename, include_outputs=True)
+    tracemalloc.start()
+    try:
+        g = Graph.load(filename)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert g.nodes[add].is_output_valid()
+    assert peak < 1000000
+
+
+def test_cached_outputs_are_reused(tmp_path):
+    filename = str(tmp_path / 'vector.pictographz')
+    vector_graph().save(filename, include_outputs=True)
+    CountingAdditionNode.total = 0
+    g = Graph.load(filename)
+    assert g.nodes[1].is_output_valid()
+    assert isinstance(g.nodes[1]._output_data_cache, np.memmap)
+    g.run()
+    assert CountingAdditionNode.total == 0
+
+
+def test_restored_outputs_are_not_recomputed_by_a_batch(tmp_path):
+    # how the GUI opens archives: outputs are restored while the nodes are being
+    # connected, and left out of the evaluation the batch does when it closes
+    from pictograph.Graph import restore_outputs
+    from pictograph.Node import batch
+    filename = str(tmp_path / 'vector.pictographz')
+    vector_graph().save(filename, include_outputs=True)
+    d, outputs = load_archive(filename)
+    CountingAdditionNode.total = 0
+    with batch() as pending:
+        v = npVectorNode(np.zeros(1))
+        v._adjust_parameter('Vector', d['glyphs'][0]['adjustable_parameters']['Vector'])
+        add = CountingAdditionNode()
+        add.set_auto_process(True)
+        add.connect_input('arg1', v)
+        add.connect_input('arg2', v)
+        assert restore_outputs({0: v, 1: add}, outputs) == [v, add]
+        pending.discard([v, add])
+    assert add.is_output_valid()
+    assert CountingAdditionNode.total == 0
+
+
+def test_stale_outputs_are_not_reused(tmp_path):
+    filename = str(tmp_path / 'vector.pictographz')
+    g = vector_graph()
+    g.save(filename, include_outputs=True)
+    # change the saved parameter without touching the saved output
+    from pictograph.Archive import save_archive
+    d, outputs = load_archive(filename, mmap=False)
+    d['glyphs'][0]['adjustable_parameters']['Vector'] = np.ones(3)
+    save_archive(filename, d, outputs)
+    g = Graph.load(filename)
+    assert not g.nodes[1].is_output_valid()
+    g.run()
+    assert (g.outputs()[1] == 2 * np.ones(3)).all()
+
+
+def test_outputs_of_nodes_with_shape_parameters_are_reused(tmp_path):
+    # shapes are tuples, but the archive reads them back as lists
+    filename = str(tmp_path / 'full.pictographz')
+    g = Graph()
+    full = g.add_node(FullNode())
+    g.set_parameter(full, 'Shape', (3, 4))
+    g.run()
+    g.save(filename, include_outputs=True)
+    g = Graph.load(filename)
+    assert g.nodes[full].is_output_valid()
+    assert g.nodes[full]._output_data_cache.shape == (3, 4)
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from .context import pictograph
+from pictograph import Node, customNodes
+from pictograph.Graph import Graph
+from pictograph.Node import AdjustableParameter
+
+
+class SlowReadNode(Node.Node):
+    # stands in for a node that waits on an instrument
+    __slots__ = ('count',)
+
+    def __init__(self, delay=0.2):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+        self._adjustable_parameters = {'Delay': AdjustableParameter(name="Delay", type="double", val=delay)}
+        self.count = 0
+
+    async def _process_core(self):
+        self.count += 1
+        await asyncio.sleep(self._adjustable_parameters['Delay']._value)
+        if self.arg1 < 0:
+            raise ValueError('negative reading')
+        return self.arg1 * 10
+
+
+def fan(n=5):
+    source = customNodes.NumberNode(1)
+    reads = [SlowReadNode() for i in range(n)]
+    total = customNodes.AdditionNode()
+    for read in reads:
+        read.connect_input("arg1", source)
+    total.connect_input("arg1", reads[0])
+    total.connect_input("arg2", reads[-1])
+    return source, reads, total
+
+
+def test_async_nodes_are_detected():
+    assert SlowReadNode._is_async
+    assert not customNodes.AdditionNode._is_async
+
+
+def test_async_nodes_wait_together():
+    source, reads, total = fan()
+    start = time.perf_counter()
+    source._adjust_parameter("Number", 2)
+    elapsed = time.perf_counter() - start
+    assert total._output_data_cache == 40
+    assert [read.count for read in reads] == [1] * 5
+    # five reads of 0.2 s each, at the same time
+    assert elapsed < 0.6
+
+
+def test_async_early_cutoff():
+    source, reads, total = fan(2)
+    source._adjust_parameter("Number", 2)
+    counts = [read.count for read in reads]
+    source._adjust_parameter("Number", 2)
+    assert [read.count for read in reads] == counts
+
+
+def test_async_node_errors():
+    source, reads, total = fan(2)
+    with pytest.raises(ValueError, match='negative reading'):
+        source._adjust_parameter("Number", -1)
+    assert not total.is_output_valid()
+
+
+def test_async_nodes_in_a_running_loop():
+    source, reads, total = fan(2)
+    Node.invalidate_downstream([source])
+
+    async def main():
+        with pytest.raises(ValueError):
+            total.evaluate()
+        await Node.process_nodes_async(Node.stale_upstream_nodes([total]))
+
+    asyncio.run(main())
+    assert total._output_data_cache == 20
+
+
+def test_async_nodes_on_executors():
+    graph = Graph()
+    source = graph.add_node(customNodes.NumberNode(3))
+    read = graph.add_node(SlowReadNode(0.01))
+    graph.connect(source, read, "arg1")
+    graph.run(executor="thread")
+    assert graph.outputs() == {read: 30}
+
+
+def test_graph_run_async():
+    graph = Graph()
+    source = graph.add_node(customNodes.NumberNode(4))
+    read = graph.add_node(SlowReadNode(0.01))
+    graph.connect(source, read, "arg1")
+    asyncio.run(graph.run_async())
+    assert graph.outputs() == {read: 40}
@@ -0,0 +1,21 @@
+from .context import pictograph
+from benchmarks import graphs
+from benchmarks.__main__ import run_benchmarks
+from pictograph.Node import topological_order
+
+
+def test_graph_shapes():
+    for shape in graphs.SHAPES:
+        graph = graphs.make_graph(shape, 50)
+        assert 45 <= len(graph.nodes) <= 50
+        assert len(topological_order(graph.nodes.values())) == len(graph.nodes)
+        graph.run()
+        assert all(node.is_output_valid() for node in graph.nodes.values())
+
+
+def test_runner():
+    results = dict(run_benchmarks('Propagation.time_full_run\\(chain', sizes=[10], repeat=1))
+    assert list(results) == ['Propagation.time_full_run(chain, 10)']
+    assert results['Propagation.time_full_run(chain, 10)']['min'] > 0
+    results = dict(run_benchmarks('Memory.peakmem_build\\(diamonds', sizes=[100], repeat=1))
+    assert results['Memory.peakmem_build(diamonds, 100)']['unit'] == 'bytes'
@@ -0,0 +1,138 @@
+import pytest
+
+from .context import pictograph
+from .nodes import CountingAdditionNode
+from pictograph import Node, customNodes
+from pictograph.Cache import MemoCache, DiskCache
+
+
+class ReadingNode(Node.Node):
+    # a source whose output isn't a function of its parameters, like a file reader
+    _memoize = False
+    value = 1
+
+    def _process_core(self):
+        return ReadingNode.value
+
+
+@pytest.fixture
+def memo():
+    cache = MemoCache(max_entries=100)
+    Node.set_memo_cache(cache)
+    yield cache
+    Node.set_memo_cache(None)
+
+
+def test_lru_eviction():
+    cache = MemoCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.stats() == {'hits': 1, 'misses': 0, 'evictions': 1, 'entries': 2, 'bytes': cache.total_bytes}
+
+
+def test_byte_limit_uses_nbytes():
+    np = pytest.importorskip('numpy')
+    cache = MemoCache(max_bytes=1000)
+    cache.put('a', np.zeros(100))
+    assert cache.total_bytes == 800
+    cache.put('b', np.zeros(100))
+    assert 'a' not in cache and 'b' in cache
+    cache.put('c', np.zeros(1000))
+    assert 'c' not in cache
+
+
+def test_toggling_a_parameter_hits_the_cache(memo):
+    n = customNodes.NumberNode(1)
+    adder = CountingAdditionNode()
+    adder.connect_input('arg1', n)
+    adder.connect_input('arg2', n)
+    CountingAdditionNode.total = 0
+    for value in [2, 3, 2, 3, 2]:
+        n._adjust_parameter('Number', value)
+        assert adder._output_data_cache == 2 * value
+    assert CountingAdditionNode.total == 2
+    assert memo.hits >= 3
+
+
+def test_reconnecting_hits_the_cache(memo):
+    n = customNodes.NumberNode(4)
+    adder = CountingAdditionNode()
+    adder.connect_input('arg1', n)
+    adder.connect_input('arg2', n)
+    adder.process()
+    CountingAdditionNode.total = 0
+    adder.disconnect_input('arg2')
+    assert not adder.is_output_valid()
+    adder.connect_input('arg2', n)
+    adder.process()
+    assert adder._output_data_cache == 8
+    assert CountingAdditionNode.total == 0
+
+
+def test_printer_is_never_memoized(memo, capsys):
+    n = customNodes.NumberNode(1)
+    p = customNodes.PrinterNode()
+    p.connect_input('arg1', n)
+    p.process()
+    p.process()
+    assert capsys.readouterr().out.count('Node value changed') == 2
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put('k1', {'a': 1})
+    assert cache.get('k1') == (True, {'a': 1})
+    assert cache.get('missing') == (False, None)
+    assert DiskCache(str(tmp_path)).get('k1') == (True, {'a': 1})
+
+
+def test_disk_cache_memory_maps_arrays(tmp_path):
+    np = pytest.importorskip('numpy')
+    cache = DiskCache(str(tmp_path))
+    cache.put('k1', np.arange(10.0))
+    found, value = cache.get('k1')
+    assert found and isinstance(value, np.memmap)
+    assert not value.flags.writeable
+    assert (value == np.arange(10.0)).all()
+
+
+def test_disk_cache_size_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=150)
+    cache.put('a', 'x' * 60)
+    cache.put('b', 'y' * 60)
+    cache.put('c', 'z' * 60)
+    assert 'c' in cache
+    assert cache.total_bytes <= 150
+    assert cache.evictions >= 1
+
+
+def test_results_survive_a_new_session(tmp_path):
+    Node.set_memo_cache(DiskCache(str(tmp_path)))
+    try:
+        CountingAdditionNode.total = 0
+        for session in range(2):
+            n = customNodes.NumberNode(5)
+            adder = CountingAdditionNode()
+            adder.connect_input('arg1', n)
+            adder.connect_input('arg2', n)
+            adder.process()
+            assert adder._output_data_cache == 10
+        assert CountingAdditionNode.total == 1
+    finally:
+        Node.set_memo_cache(None)
+
+
+def test_values_of_unmemoized_inputs_are_fingerprinted(memo):
+    source = ReadingNode()
+    adder = CountingAdditionNode()
+    adder.connect_input('arg1', source)
+    adder.connect_input('arg2', source)
+    CountingAdditionNode.total = 0
+    for value in [1, 2, 1]:
+        ReadingNode.value = value
+        source.process()
+        assert adder._output_data_cache == 2 * value
+    assert CountingAdditionNode.total == 2
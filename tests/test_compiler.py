@@ -0,0 +1,150 @@
+import pytest
+
+from .context import pictograph
+from pictograph import customNodes
+from pictograph.Compiler import FusedKernel, compile_nodes, process_nodes_compiled
+from pictograph.Graph import Graph
+from pictograph.Node import downstream_nodes
+
+
+def make_chain(a, b, c, d):
+    # (a + b) * c - d, plus a printer-free second consumer of c
+    nodes = [customNodes.NumberNode(v) for v in (a, b, c, d)]
+    add = customNodes.AdditionNode()
+    mul = customNodes.MultiplicationNode()
+    sub = customNodes.SubtractionNode()
+    add.connect_input("arg1", nodes[0])
+    add.connect_input("arg2", nodes[1])
+    mul.connect_input("arg1", add)
+    mul.connect_input("arg2", nodes[2])
+    sub.connect_input("arg1", mul)
+    sub.connect_input("arg2", nodes[3])
+    return nodes, add, mul, sub
+
+
+def test_chain_is_fused():
+    nodes, add, mul, sub = make_chain(1, 2, 3, 4)
+    steps = compile_nodes(downstream_nodes(nodes))
+    kernels = [s for s in steps if isinstance(s, FusedKernel)]
+    assert len(kernels) == 1
+    assert kernels[0].root is sub
+    assert kernels[0].interior == [mul, add]
+    assert kernels[0].expression() == '(((v0 + v1) * v2) - v3)'
+    process_nodes_compiled(downstream_nodes(nodes))
+    assert sub._output_data_cache == 5
+    assert not add.is_output_valid()
+    assert add.evaluate() == 3
+
+
+class ClippedAdditionNode(customNodes.AdditionNode):
+    # inherits the "add" operation, but computes something else
+    def _process_core(self):
+        return min(super()._process_core(), 10)
+
+
+def test_overridden_nodes_are_not_fused():
+    nodes, add, mul, sub = make_chain(1, 2, 3, 4)
+    clipped = ClippedAdditionNode()
+    clipped.connect_input("arg1", sub)
+    clipped.connect_input("arg2", nodes[0])
+    process_nodes_compiled(downstream_nodes(nodes))
+    assert sub._output_data_cache == 5
+    assert clipped._output_data_cache == 6
+    nodes[3]._adjust_parameter("Number", -10, process=False)
+    process_nodes_compiled(downstream_nodes(nodes))
+    assert clipped._output_data_cache == 10
+
+
+def test_long_chains_are_split():
+    from pictograph import Compiler, Node
+    from pictograph.Cache import MemoCache
+    for cache in [None, MemoCache()]:
+        Node.set_memo_cache(cache)
+        try:
+            one = customNodes.NumberNode(1)
+            last = one
+            for i in range(3000):
+                add = customNodes.AdditionNode()
+                add.connect_input("arg1", last)
+                add.connect_input("arg2", one)
+                last = add
+            steps = compile_nodes(downstream_nodes([one]))
+            assert len(steps) == 1 + -(-3000 // Compiler.MAX_FUSED_DEPTH)
+            process_nodes_compiled(downstream_nodes([one]))
+            assert last._output_data_cache == 3001
+        finally:
+            Node.set_memo_cache(None)
+
+
+def test_shared_nodes_are_not_fused():
+    nodes, add, mul, sub = make_chain(1, 2, 3, 4)
+    other = customNodes.MultiplicationNode()
+    other.connect_input("arg1", mul)
+    other.connect_input("arg2", nodes[0])
+    process_nodes_compiled(downstream_nodes(nodes))
+    assert mul.is_output_valid()
+    assert not add.is_output_valid()
+    assert sub._output_data_cache == 5
+    assert other._output_data_cache == 9
+
+
+def test_strings_fall_back_to_python():
+    first = customNodes.StringNode("a")
+    second = customNodes.StringNode("b")
+    add = customNodes.AdditionNode()
+    twice = customNodes.AdditionNode()
+    add.connect_input("arg1", first)
+    add.connect_input("arg2", second)
+    twice.connect_input("arg1", add)
+    twice.connect_input("arg2", first)
+    process_nodes_compiled(downstream_nodes([first, second]))
+    assert twice._output_data_cache == "aba"
+
+
+def test_arrays_match_unfused():
+    np = pytest.importorskip('numpy')
+    from pictograph.NumpyNodes import npVectorNode
+    values = [np.arange(6, dtype=np.int32), np.linspace(0, 1, 6), np.float32(2.0), np.ones((2, 1, 6))]
+    nodes = [npVectorNode(v) for v in values]
+    add = customNodes.AdditionNode()
+    mul = customNodes.MultiplicationNode()
+    sub = customNodes.SubtractionNode()
+    add.connect_input("arg1", nodes[0])
+    add.connect_input("arg2", nodes[1])
+    mul.connect_input("arg1", add)
+    mul.connect_input("arg2", nodes[2])
+    sub.connect_input("arg1", nodes[3])
+    sub.connect_input("arg2", mul)
+    process_nodes_compiled(downstream_nodes(nodes))
+    expected = values[3] - (values[0] + values[1]) * values[2]
+    assert sub._output_data_cache.shape == expected.shape
+    assert sub._output_data_cache.dtype == expected.dtype
+    assert np.allclose(sub._output_data_cache, expected)
+
+
+def test_fused_outputs_are_reused(monkeypatch):
+    np = pytest.importorskip('numpy')
+    from pictograph import Compiler
+    from pictograph.NumpyNodes import npVectorNode
+    monkeypatch.setattr(Compiler, 'numexpr', None)
+    nodes, add, mul, sub = make_chain(1, 2, 3, 4)
+    vector = npVectorNode(np.arange(1000.0))
+    add.disconnect_input("arg1")
+    add.connect_input("arg1", vector)
+    process_nodes_compiled(downstream_nodes([vector] + nodes))
+    address = sub._output_data_cache.ctypes.data
+    nodes[1]._adjust_parameter("Number", 5, process=False)
+    process_nodes_compiled(downstream_nodes([nodes[1]]))
+    assert sub._output_data_cache.ctypes.data == address
+    assert np.array_equal(sub._output_data_cache, (np.arange(1000.0) + 5) * 3 - 4)
+
+
+def test_graph_run_compiled():
+    graph = Graph()
+    nodes, add, mul, sub = make_chain(1, 2, 3, 4)
+    for node in nodes + [add, mul, sub]:
+        graph.add_node(node)
+    graph.run(compile=True)
+    assert graph.outputs(graph.sinks()) == {graph.node_ids[sub]: 5}
+    with pytest.raises(ValueError):
+        graph.run(executor="thread", compile=True)
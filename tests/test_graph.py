@@ -0,0 +1,168 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .context import pictograph
+from pictograph import customNodes
+from pictograph.Graph import Graph, ItemIndex
+from pictograph.__main__ import main
+
+here = os.path.dirname(__file__)
+
+
+def test_load_and_run():
+    g = Graph.load(os.path.join(here, 'test.pictograph'))
+    g.run()
+    assert g.sinks() == [2]
+    assert g.outputs() == {2: 3.14 + 2.0}
+
+
+def test_set_parameter_from_string():
+    g = Graph.load(os.path.join(here, 'test.pictograph'))
+    g.set_parameter_from_string(0, 'Number', '3')
+    g.run()
+    assert g.outputs()[2] == 5.0
+
+
+def test_round_trip():
+    g = Graph.load(os.path.join(here, 'test.pictograph'))
+    d = g.to_dict()
+    assert d['glyphs'][0]['Position'] == {'x': 54.0, 'y': 49.0}
+    assert d['glyphs'][0]['node_module'] == 'customNodes'
+    g2 = Graph.from_dict(d)
+    g2.run()
+    assert g2.outputs() == {2: 3.14 + 2.0}
+
+
+def test_cli(capsys):
+    assert main(['run', os.path.join(here, 'test.pictograph'), '--set', '0.Number=3']) == 0
+    assert capsys.readouterr().out.strip() == '2.AdditionNode = 5.0'
+
+
+def test_cli_runs_the_other_files_when_a_node_raises(tmp_path, capsys):
+    # "a" + 1 raises a TypeError
+    g = Graph()
+    text = g.add_node(customNodes.StringNode("a"))
+    number = g.add_node(customNodes.NumberNode(1))
+    total = g.add_node(customNodes.AdditionNode())
+    g.connect(text, total, 'arg1')
+    g.connect(number, total, 'arg2')
+    broken = str(tmp_path / 'broken.pictograph')
+    g.save(broken)
+    assert main(['run', broken, os.path.join(here, 'test.pictograph')]) == 1
+    captured = capsys.readouterr()
+    assert captured.err.startswith(broken + ': ')
+    assert '2.AdditionNode = 5.14' in captured.out
+    assert main(['sweep', broken, '--vary', '1.Number=1;2']) == 1
+    assert capsys.readouterr().err.startswith(broken + ': ')
+
+
+def test_cli_sweeps_shapes(tmp_path, capsys):
+    pytest.importorskip('numpy')
+    from pictograph.NumpyNodes import FullNode
+    g = Graph()
+    g.add_node(FullNode())
+    filename = str(tmp_path / 'full.pictograph')
+    g.save(filename)
+    assert main(['sweep', filename, '--vary', '0.Shape=3,4;2']) == 0
+    lines = [line for line in capsys.readouterr().out.split('\n') if line.startswith('0.')]
+    assert [line.split(':')[0] for line in lines] == ['0.Shape=(3, 4)', '0.Shape=(2,)']
+
+
+def test_cli_does_not_import_qt():
+    # in a fresh interpreter, since other tests may have imported Qt already
+    code = ("import sys; from pictograph.__main__ import main; "
+            "main(['run', sys.argv[1]]); print('PyQt5' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', code, os.path.join(here, 'test.pictograph')],
+                            cwd=os.path.join(here, '..'), stdout=subprocess.PIPE, universal_newlines=True)
+    assert result.stdout.split() == ['2.AdditionNode', '=', '5.140000000000001', 'False']
+
+
+class CountingMultiplicationNode(customNodes.MultiplicationNode):
+    count = 0
+
+    def _process_core(self):
+        CountingMultiplicationNode.count += 1
+        return super()._process_core()
+
+
+def two_branches():
+    # (a + b) and (c * c) are independent
+    g = Graph()
+    a = g.add_node(customNodes.NumberNode(1))
+    b = g.add_node(customNodes.NumberNode(2))
+    c = g.add_node(customNodes.NumberNode(3))
+    add = g.add_node(customNodes.AdditionNode())
+    mul = g.add_node(CountingMultiplicationNode())
+    g.connect(a, add, 'arg1')
+    g.connect(b, add, 'arg2')
+    g.connect(c, mul, 'arg1')
+    g.connect(c, mul, 'arg2')
+    return g
+
+
+def test_sweep():
+    g = two_branches()
+    runs = [{(0, 'Number'): 10}, {(0, 'Number'): 20}, {(2, 'Number'): 5}]
+    assert list(g.sweep(runs)) == [{3: 12, 4: 9}, {3: 22, 4: 9}, {3: 3, 4: 25}]
+
+
+def test_sweep_restores_the_parameters():
+    g = two_branches()
+    g.run()
+    for outputs in g.sweep([{(0, 'Number'): 10, (2, 'Number'): 5}, {(0, 'Number'): 20}]):
+        pass
+    assert g.parameter(0, 'Number')._value == 1 and g.parameter(2, 'Number')._value == 3
+    assert g.outputs([3, 4]) == {3: 3, 4: 9}
+    sweep = g.sweep([{(0, 'Number'): 10}, {(0, 'Number'): 20}])
+    assert next(sweep) == {3: 12, 4: 9}
+    sweep.close()
+    assert g.outputs([3, 4]) == {3: 3, 4: 9}
+
+
+def test_sweep_only_recomputes_changed_cone():
+    g = two_branches()
+    CountingMultiplicationNode.count = 0
+    list(g.sweep({(0, 'Number'): v} for v in range(10)))
+    assert CountingMultiplicationNode.count == 1
+
+
+def test_sweep_in_processes():
+    g = two_branches()
+    runs = [{(0, 'Number'): v, (2, 'Number'): v} for v in range(7)]
+    expected = list(two_branches().sweep(runs, node_ids=[3, 4]))
+    assert list(g.sweep(runs, node_ids=[3, 4], processes=2)) == expected
+
+
+def test_item_index():
+    index = ItemIndex(['a', 'b', 'c'])
+    index.remove('b')
+    index.append('d')
+    assert list(index) == ['a', 'c', 'd']
+    assert [index.id_of(x) for x in index] == [0, 2, 3]
+    assert index.item(3) == 'd'
+    assert 'b' not in index and len(index) == 3
+    index.discard('b')
+    with pytest.raises(ValueError):
+        index.remove('b')
+
+
+def test_evaluate_only_pulls_what_is_needed():
+    g = two_branches()
+    CountingMultiplicationNode.count = 0
+    assert g.evaluate([3]) == {3: 3}
+    assert CountingMultiplicationNode.count == 0
+    assert not g.nodes[4].is_output_valid()
+
+
+def test_batch_edits():
+    g = Graph.load(os.path.join(here, 'test.pictograph'))
+    g.run()
+    with g.batch():
+        g.set_parameter(0, 'Number', 3)
+        assert g.nodes[2].is_output_valid()
+    assert not g.nodes[2].is_output_valid()
+    g.run()
+    assert g.outputs()[2] == 5.0
@@ -1,4 +1,8 @@
+import pytest
+
 from .context import pictograph
+from .nodes import CountingAdditionNode
+from pictograph import Node, customNodes
 from pictograph.customNodes import NumberNode, PrinterNode
 
 def test_valid():
@@ -12,3 +16,359 @@ def test_connection():
     n._adjustable_parameters['Number']._value = 2
 
     assert n._process_core() == 2
+
+
+def diamond():
+    n = NumberNode(1)
+    left = CountingAdditionNode()
+    right = CountingAdditionNode()
+    bottom = CountingAdditionNode()
+    for node in (left, right, bottom):
+        node.set_auto_process(True)
+    left.connect_input("arg1", n)
+    left.connect_input("arg2", n)
+    right.connect_input("arg1", n)
+    right.connect_input("arg2", n)
+    bottom.connect_input("arg1", left)
+    bottom.connect_input("arg2", right)
+    return n, left, right, bottom
+
+
+def test_scheduled_diamond_runs_each_node_once():
+    n, left, right, bottom = diamond()
+    counts = (left.count, right.count, bottom.count)
+    n._adjust_parameter("Number", 2)
+    assert bottom._output_data_cache == 8
+    assert (left.count, right.count, bottom.count) == tuple(c + 1 for c in counts)
+
+
+def test_observer_mode_is_still_available():
+    Node.set_evaluation_mode(Node.OBSERVER_MODE)
+    try:
+        n, left, right, bottom = diamond()
+        count = bottom.count
+        n._adjust_parameter("Number", 2)
+        assert bottom._output_data_cache == 8
+        assert bottom.count - count == 2
+    finally:
+        Node.set_evaluation_mode(Node.SCHEDULED_MODE)
+
+
+def test_deep_chain_does_not_recurse():
+    n = NumberNode(1)
+    last = n
+    for i in range(5000):
+        a = customNodes.AdditionNode()
+        a.connect_input("arg1", last)
+        a.connect_input("arg2", n)
+        last = a
+    n._adjust_parameter("Number", 2)
+    assert last._output_data_cache == 10002
+    n._invalidate_output()
+    assert not last.is_output_valid()
+
+
+def test_topological_order():
+    n, left, right, bottom = diamond()
+    order = Node.topological_order([bottom, right, left, n])
+    assert order.index(n) < order.index(left) < order.index(bottom)
+    assert order.index(right) < order.index(bottom)
+
+
+def test_lazy_mode_only_computes_what_is_requested():
+    Node.set_evaluation_mode(Node.LAZY_MODE)
+    try:
+        n, left, right, bottom = diamond()
+        idle = CountingAdditionNode()
+        idle.connect_input("arg1", n)
+        idle.connect_input("arg2", n)
+        counts = (left.count, right.count, bottom.count, idle.count)
+        n._adjust_parameter("Number", 5)
+        assert not bottom.is_output_valid()
+        assert (left.count, right.count, bottom.count, idle.count) == counts
+        assert bottom.evaluate() == 20
+        assert (left.count, right.count, bottom.count, idle.count) == (
+            counts[0] + 1, counts[1] + 1, counts[2] + 1, counts[3])
+        assert bottom.evaluate() == 20
+        assert bottom.count == counts[2] + 1
+    finally:
+        Node.set_evaluation_mode(Node.SCHEDULED_MODE)
+
+
+def test_lazy_mode_computes_sinks(capsys):
+    Node.set_evaluation_mode(Node.LAZY_MODE)
+    try:
+        n = NumberNode(1)
+        p = PrinterNode()
+        p.set_auto_process(True)
+        p.connect_input("arg1", n)
+        capsys.readouterr()
+        n._adjust_parameter("Number", 7)
+        assert 'Node value changed to "7"' in capsys.readouterr().out
+    finally:
+        Node.set_evaluation_mode(Node.SCHEDULED_MODE)
+
+
+def test_nodes_have_no_dict():
+    n = NumberNode(3)
+    add = customNodes.AdditionNode()
+    assert not hasattr(n, '__dict__') and not hasattr(add, '__dict__')
+    assert not hasattr(n._adjustable_parameters['Number'], '__dict__')
+    assert add.displayName == "Add"
+
+
+def test_inputs_are_read_through_terminals():
+    n = NumberNode(3)
+    m = NumberNode(4)
+    add = customNodes.AdditionNode()
+    assert add.arg1 is None
+    add.connect_input("arg1", n)
+    add.connect_input("arg2", m)
+    assert (add.arg1, add.arg2) == (3, 4)
+    n._adjust_parameter("Number", 5)
+    assert add.arg1 == 5 and add._output_data_cache == 9
+    copy = add._detached_copy()
+    n._adjust_parameter("Number", 6)
+    assert copy.arg1 == 5 and copy._process_core() == 9
+    try:
+        add.arg3
+        assert False
+    except AttributeError:
+        pass
+
+
+def zeroed_chain():
+    # n * 0 is 0 whatever n is
+    n = NumberNode(1)
+    zero = NumberNode(0)
+    product = customNodes.MultiplicationNode()
+    total = CountingAdditionNode()
+    for node in (product, total):
+        node.set_auto_process(True)
+    product.connect_input("arg1", n)
+    product.connect_input("arg2", zero)
+    total.connect_input("arg1", product)
+    total.connect_input("arg2", product)
+    return n, total
+
+
+def test_early_cutoff():
+    n, total = zeroed_chain()
+    count = total.count
+    n._adjust_parameter("Number", 5)
+    assert total.count == count
+    assert total.is_output_valid() and total._output_data_cache == 0
+
+
+def test_no_cutoff_policy():
+    class EagerNumberNode(NumberNode):
+        _cutoff = Node.NO_CUTOFF
+    n = EagerNumberNode(1)
+    total = CountingAdditionNode()
+    total.set_auto_process(True)
+    total.connect_input("arg1", n)
+    total.connect_input("arg2", n)
+    count = total.count
+    n.process()
+    assert total.count == count + 1
+    n._cutoff = Node.EQUALITY_CUTOFF
+    n.process()
+    assert total.count == count + 1
+
+
+def test_large_arrays_are_not_compared():
+    np = pytest.importorskip('numpy')
+
+    class ZerosNode(NumberNode):
+        # the same zeros whatever the number is
+        size = 10
+
+        def _process_core(self):
+            return np.zeros(ZerosNode.size)
+    n = ZerosNode(1)
+    total = CountingAdditionNode()
+    total.set_auto_process(True)
+    total.connect_input("arg1", n)
+    total.connect_input("arg2", n)
+    n.process()
+    count = total.count
+    n._adjust_parameter("Number", 2)
+    assert total.count == count
+    ZerosNode.size = Node.MAX_COMPARED_BYTES // 8 + 1
+    n._adjust_parameter("Number", 3)
+    count = total.count
+    n._adjust_parameter("Number", 4)
+    assert total.count == count + 1
+
+
+def test_observer_mode_early_cutoff():
+    Node.set_evaluation_mode(Node.OBSERVER_MODE)
+    try:
+        n, total = zeroed_chain()
+        count = total.count
+        n._adjust_parameter("Number", 5)
+        assert total.count == count
+    finally:
+        Node.set_evaluation_mode(Node.SCHEDULED_MODE)
+
+
+def test_cutoff_policies():
+    assert Node.same_output(Node.EQUALITY_CUTOFF, [1, 2], [1, 2])
+    assert not Node.same_output(Node.IDENTITY_CUTOFF, [1, 2], [1, 2])
+    assert not Node.same_output(Node.NO_CUTOFF, 1, 1)
+    assert not Node.same_output(Node.EQUALITY_CUTOFF, 1, 1.0)
+    np = pytest.importorskip('numpy')
+    a = np.array([1.0, np.nan])
+    assert not Node.same_output(Node.EQUALITY_CUTOFF, a, a.copy())
+    assert Node.same_output(Node.FINGERPRINT_CUTOFF, a, a.copy())
+
+
+def test_connect_rejects_cycles():
+    n = NumberNode(1)
+    a = customNodes.AdditionNode()
+    b = customNodes.AdditionNode()
+    a.connect_input("arg1", n)
+    b.connect_input("arg1", a)
+    with pytest.raises(ValueError):
+        a.connect_input("arg2", a)
+    with pytest.raises(ValueError):
+        a.connect_input("arg2", b)
+    # nothing was changed by the rejected connections
+    assert a._input_terminals["arg2"] is None
+    assert list(b._output_terminals) == []
+    b.connect_input("arg2", n)
+
+
+def test_order_stays_topological():
+    # connect nodes created in random order, and compare the cycle check with a
+    # brute-force search
+    import random
+    rng = random.Random(1)
+    nodes = [customNodes.AdditionNode() for i in range(40)]
+    rng.shuffle(nodes)
+
+    def reaches(start, goal):
+        stack, seen = [start], set()
+        while stack:
+            node = stack.pop()
+            if node is goal:
+                return True
+            if node not in seen:
+                seen.add(node)
+                stack.extend(node._output_terminals)
+        return False
+
+    for i in range(400):
+        source, target = rng.choice(nodes), rng.choice(nodes)
+        key = rng.choice(["arg1", "arg2"])
+        if target._input_terminals[key] is not None:
+            target.disconnect_input(key)
+        makes_cycle = reaches(target, source)
+        try:
+            target.connect_input(key, source)
+            assert not makes_cycle
+        except ValueError:
+            assert makes_cycle
+        for node in nodes:
+            for output_node in node._output_terminals:
+                assert node._order < output_node._order
+
+
+def test_batch_defers_evaluation():
+    n = NumberNode(1)
+    with Node.batch():
+        chain = []
+        previous = n
+        for i in range(5):
+            node = CountingAdditionNode()
+            node.set_auto_process(True)
+            node.connect_input("arg1", previous)
+            node.connect_input("arg2", n)
+            chain.append(node)
+            previous = node
+        n._adjust_parameter("Number", 2)
+        # nested batches commit with the outermost one
+        with Node.batch():
+            n._adjust_parameter("Number", 3)
+        assert [node.count for node in chain] == [0] * 5
+    assert [node.count for node in chain] == [1] * 5
+    assert chain[-1]._output_data_cache == 18
+
+
+def test_batch_defers_invalidation():
+    n, left, right, bottom = diamond()
+    with Node.batch():
+        bottom.disconnect_input("arg2")
+        assert bottom.is_output_valid()
+    assert not bottom.is_output_valid()
+    counts = (left.count, right.count)
+    with Node.batch():
+        bottom.connect_input("arg2", right)
+    assert bottom._output_data_cache == 4
+    assert (left.count, right.count) == counts
+
+
+def test_batch_commits_after_an_exception():
+    n, left, right, bottom = diamond()
+    with pytest.raises(ValueError):
+        with Node.batch():
+            n._adjust_parameter("Number", 2)
+            left.connect_input("arg1", bottom)
+    assert bottom._output_data_cache == 8
+
+
+def array_chain():
+    np = pytest.importorskip('numpy')
+    from pictograph.NumpyNodes import OnesNode
+    ones = OnesNode()
+    ones._adjust_parameter("Length", 1000)
+    n = NumberNode(1.0)
+    total = customNodes.AdditionNode()
+    total.connect_input("arg1", ones)
+    total.connect_input("arg2", n)
+    total.process()
+    return np, ones, n, total
+
+
+def test_outputs_are_reused():
+    np, ones, n, total = array_chain()
+    address = total._output_data_cache.ctypes.data
+    n._adjust_parameter("Number", 2.0)
+    assert total._output_data_cache.ctypes.data == address
+    assert np.array_equal(total._output_data_cache, np.full((1, 1000), 3.0))
+    # also after the output was invalidated
+    Node.invalidate_downstream([ones])
+    Node.process_nodes(Node.stale_upstream_nodes([total]))
+    assert total._output_data_cache.ctypes.data == address
+    assert np.array_equal(total._output_data_cache, np.full((1, 1000), 3.0))
+
+
+def test_outputs_in_use_are_not_overwritten():
+    np, ones, n, total = array_chain()
+    first = total._output_data_cache
+    n._adjust_parameter("Number", 2.0)
+    assert total._output_data_cache is not first
+    assert np.array_equal(first, np.full((1, 1000), 2.0))
+    view = total._output_data_cache[0, :10]
+    n._adjust_parameter("Number", 3.0)
+    assert np.array_equal(view, np.full(10, 3.0))
+    assert np.array_equal(total._output_data_cache, np.full((1, 1000), 4.0))
+    # once the view is gone, the memory it is in is written into again
+    view = total._output_data_cache[0, :10]
+    address = view.ctypes.data
+    del view
+    n._adjust_parameter("Number", 4.0)
+    assert total._output_data_cache.ctypes.data == address
+
+
+def test_memoized_outputs_are_not_overwritten():
+    from pictograph.Cache import MemoCache
+    np, ones, n, total = array_chain()
+    Node.set_memo_cache(MemoCache())
+    try:
+        n._adjust_parameter("Number", 2.0)
+        n._adjust_parameter("Number", 3.0)
+        n._adjust_parameter("Number", 2.0)
+        assert np.array_equal(total._output_data_cache, np.full((1, 1000), 3.0))
+    finally:
+        Node.set_memo_cache(None)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from .context import pictograph
+from pictograph.Graph import Graph, format_parameter, parse_parameter
+
+np = pytest.importorskip('numpy')
+from pictograph import NumpyNodes
+
+
+def run_node(node, *inputs, **parameters):
+    # evaluate node on the given input arrays, with parameters set from strings
+    g = Graph()
+    node_id = g.add_node(node)
+    for key, value in zip(node._input_terminals, inputs):
+        source = g.add_node(NumpyNodes.npVectorNode(value))
+        g.connect(source, node_id, key)
+    for key, text in parameters.items():
+        g.set_parameter_from_string(node_id, key, text)
+    g.run()
+    return g.outputs([node_id])[node_id]
+
+
+def test_sources():
+    assert np.array_equal(run_node(NumpyNodes.ArangeNode(), Stop='5'), np.arange(5.0))
+    assert run_node(NumpyNodes.LinspaceNode(), Count='11', dtype='float32').dtype == np.float32
+    full = run_node(NumpyNodes.FullNode(), Shape='2, 3', **{'Fill value': '7'})
+    assert full.shape == (2, 3) and (full == 7).all()
+    # float32 takes half the memory
+    ones = [run_node(NumpyNodes.OnesNode(), Length='1000', dtype=t) for t in ['float64', 'float32']]
+    assert ones[1].nbytes * 2 == ones[0].nbytes
+
+
+def test_operations():
+    a = np.arange(12.0).reshape(3, 4)
+    assert np.array_equal(run_node(NumpyNodes.ReduceNode(), a, Axes='0'), a.sum(axis=0))
+    assert run_node(NumpyNodes.ReduceNode(), a, Operation='max') == 11
+    assert np.array_equal(run_node(NumpyNodes.MatMulNode(), a, a.T), a @ a.T)
+    assert np.allclose(run_node(NumpyNodes.FFTNode(), a[0]), np.fft.fft(a[0]))
+    assert np.array_equal(run_node(NumpyNodes.ConvolveNode(), a[0], a[1], Mode='same'),
+                          np.convolve(a[0], a[1], mode='same'))
+    with pytest.raises(ValueError):
+        run_node(NumpyNodes.ReduceNode(), a, Operation='median')
+
+
+def test_views():
+    a = np.arange(12.0).reshape(3, 4)
+    for node, parameters, expected in [
+            (NumpyNodes.SliceNode(), {'Index': '1:, ::2'}, a[1:, ::2]),
+            (NumpyNodes.ReshapeNode(), {'Shape': '4, -1'}, a.reshape(4, -1)),
+            (NumpyNodes.TransposeNode(), {}, a.T),
+            (NumpyNodes.BroadcastNode(), {'Shape': '2, 3, 4'}, np.broadcast_to(a, (2, 3, 4))),
+            (NumpyNodes.AsTypeNode(), {'dtype': 'float64'}, a)]:
+        output = run_node(node, a, **parameters)
+        assert np.array_equal(output, expected)
+        assert np.shares_memory(output, a)
+
+
+def test_parse_index():
+    assert NumpyNodes.parse_index('0, 1:10:2, ..., None') == (0, slice(1, 10, 2), Ellipsis, None)
+    assert NumpyNodes.parse_index('') == ()
+    with pytest.raises(ValueError):
+        NumpyNodes.parse_index('1:2:3:4')
+
+
+def test_parameter_text():
+    node = NumpyNodes.ReshapeNode()
+    shape = node._adjustable_parameters['Shape']
+    shape._value = parse_parameter(shape, '4, -1')
+    assert shape._value == (4, -1) and format_parameter(shape) == '4, -1'
+    vector = NumpyNodes.npVectorNode()._adjustable_parameters['Vector']
+    assert np.array_equal(parse_parameter(vector, format_parameter(vector)), vector._value)
+
+
+def test_round_trip():
+    g = Graph()
+    node_id = g.add_node(NumpyNodes.FullNode())
+    g.set_parameter_from_string(node_id, 'Shape', '2, 2')
+    g.set_parameter_from_string(node_id, 'dtype', 'int32')
+    g2 = Graph.from_dict(json.loads(json.dumps(g.to_dict())))
+    g2.run()
+    assert g2.outputs()[node_id].shape == (2, 2)
+    assert g2.outputs()[node_id].dtype == np.int32
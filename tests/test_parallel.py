@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from .context import pictograph
+from pictograph import customNodes
+from pictograph.Graph import Graph
+from pictograph.Parallel import make_executor, process_nodes_parallel
+
+
+class SlowNode(customNodes.AdditionNode):
+    def _process_core(self):
+        time.sleep(0.05)
+        return super()._process_core()
+
+
+class FailingNode(customNodes.AdditionNode):
+    def _process_core(self):
+        raise ZeroDivisionError('node failed')
+
+
+def fan_out(node_class, width):
+    g = Graph()
+    source = g.add_node(customNodes.NumberNode(1))
+    total = source
+    for i in range(width):
+        branch = g.add_node(node_class())
+        g.connect(source, branch, 'arg1')
+        g.connect(source, branch, 'arg2')
+        adder = g.add_node(customNodes.AdditionNode())
+        g.connect(total, adder, 'arg1')
+        g.connect(branch, adder, 'arg2')
+        total = adder
+    return g, total
+
+
+@pytest.mark.parametrize('kind', ['thread', 'process'])
+def test_parallel_matches_serial(kind):
+    g, total = fan_out(customNodes.AdditionNode, 20)
+    g.run()
+    expected = g.outputs()
+    g2, _ = fan_out(customNodes.AdditionNode, 20)
+    g2.run(kind, max_workers=4)
+    assert g2.outputs() == expected == {total: 41}
+
+
+def test_threads_run_branches_at_the_same_time():
+    g, total = fan_out(SlowNode, 8)
+    start = time.perf_counter()
+    g.run('thread', max_workers=8)
+    assert time.perf_counter() - start < 8 * 0.05
+    assert g.outputs()[total] == 17
+
+
+def test_exceptions_reach_the_caller():
+    g, total = fan_out(FailingNode, 3)
+    with make_executor('thread', 2) as executor:
+        with pytest.raises(ZeroDivisionError):
+            process_nodes_parallel(g.nodes.values(), executor)
+    assert not g.nodes[total].is_output_valid()
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        make_executor('gpu')
@@ -0,0 +1,71 @@
+import json
+
+from .context import pictograph
+from pictograph import customNodes
+from pictograph.Cache import MemoCache
+from pictograph.Graph import Graph
+from pictograph.Node import get_profiler, process_nodes, set_memo_cache
+from pictograph.Profiler import Profiler
+
+
+def make_graph():
+    graph = Graph()
+    a = graph.add_node(customNodes.NumberNode(2))
+    b = graph.add_node(customNodes.NumberNode(3))
+    add = graph.add_node(customNodes.AdditionNode())
+    graph.connect(a, add, "arg1")
+    graph.connect(b, add, "arg2")
+    return graph, add
+
+
+def test_records_calls_and_times():
+    graph, add = make_graph()
+    with Profiler() as profiler:
+        graph.run()
+        graph.set_parameter(0, "Number", 5)
+        graph.run()
+    assert get_profiler() is None
+    stats = profiler.stats[graph.nodes[add]]
+    assert stats.calls == 2
+    assert stats.total_time >= stats.last_time > 0
+    assert stats.output_bytes > 0
+    rows = profiler.report(graph.node_labels())
+    # number nodes start out valid, so only the one that changed ran
+    assert {row['node'] for row in rows} == {'0.NumberNode', '2.AdditionNode'}
+    assert json.loads(profiler.to_json())['nodes'][0]['calls'] >= 1
+
+
+def test_cache_hits():
+    graph, add = make_graph()
+    set_memo_cache(MemoCache())
+    try:
+        with Profiler() as profiler:
+            graph.run()
+            node = graph.nodes[add]
+            node._clear_output()
+            process_nodes([node])
+    finally:
+        set_memo_cache(None)
+    stats = profiler.stats[graph.nodes[add]]
+    assert stats.calls == 1
+    assert stats.cache_hits == 1
+
+
+def test_chrome_trace(tmp_path):
+    graph, add = make_graph()
+    with Profiler() as profiler:
+        graph.run()
+    filename = str(tmp_path / 'trace.json')
+    profiler.save_chrome_trace(filename, graph.node_labels())
+    with open(filename) as f:
+        events = json.load(f)['traceEvents']
+    assert [e['name'] for e in events] == ['2.AdditionNode']
+    assert events[0]['ph'] == 'X' and events[0]['dur'] >= 0
+
+
+def test_process_pool_timings():
+    graph, add = make_graph()
+    with Profiler() as profiler:
+        graph.run(executor="process", max_workers=2)
+    assert graph.outputs() == {add: 5}
+    assert profiler.stats[graph.nodes[add]].calls == 1
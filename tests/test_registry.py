@@ -0,0 +1,42 @@
+import pytest
+
+from .context import pictograph
+from pictograph import customNodes
+from pictograph.Registry import NodeRegistry
+
+LIBRARY = '''
+from pictograph.Node import Node
+imports.append(1)
+
+class TripleNode(Node):
+    def __init__(self):
+        super().__init__()
+        self._input_terminals = {"arg1": None}
+
+    def _process_core(self):
+        return 3 * self.arg1
+'''
+
+
+def test_find_returns_the_imported_classes():
+    registry = NodeRegistry()
+    assert registry.find('customNodes', 'NumberNode') is customNodes.NumberNode
+    assert registry.find('pictograph.customNodes', 'NumberNode') is customNodes.NumberNode
+
+
+def test_library_files_are_executed_once(tmp_path, monkeypatch):
+    import builtins
+    monkeypatch.setattr(builtins, 'imports', [], raising=False)
+    path = tmp_path / 'tripleNodes.py'
+    path.write_text('import builtins\nimports = builtins.imports\n' + LIBRARY)
+    registry = NodeRegistry()
+    classes = registry.node_classes('tripleNodes', str(path))
+    assert list(classes) == ['TripleNode']
+    for i in range(100):
+        assert registry.find('tripleNodes', 'TripleNode') is classes['TripleNode']
+    assert builtins.imports == [1]
+
+
+def test_unknown_class():
+    with pytest.raises(ValueError):
+        NodeRegistry().find('customNodes', 'NoSuchNode')
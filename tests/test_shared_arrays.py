@@ -0,0 +1,113 @@
+import gc
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from .context import pictograph
+from pictograph import customNodes
+
+np = pytest.importorskip('numpy')
+from pictograph import SharedArrays
+from pictograph.Graph import Graph
+from pictograph.Node import invalidate_downstream
+from pictograph.NumpyNodes import OnesNode
+
+pytestmark = pytest.mark.skipif(not SharedArrays.ENABLED, reason='shared memory transport is posix only')
+
+
+def test_share_and_open():
+    a = np.arange(100000.0)
+    handle = SharedArrays.share(a)
+    assert isinstance(handle, SharedArrays.SharedArray)
+    assert SharedArrays.share(a) is handle
+    assert handle.name in SharedArrays.shared_segments()
+    b = SharedArrays.open_shared(pickle.loads(pickle.dumps(handle)))
+    assert np.array_equal(a, b)
+    assert not b.flags.writeable
+    del a, b
+    gc.collect()
+    assert handle.name not in SharedArrays.shared_segments()
+
+
+def test_small_values_are_pickled():
+    for value in [np.arange(10.0), 'text', 3, np.array([object()] * 100000)]:
+        assert SharedArrays.share(value) is value
+        assert SharedArrays.export(value) is value
+
+
+def test_process_pool_outputs_live_in_shared_memory():
+    g = Graph()
+    ones = g.add_node(OnesNode())
+    g.set_parameter(ones, 'Length', 100000)
+    total = g.add_node(customNodes.AdditionNode())
+    g.connect(ones, total, 'arg1')
+    g.connect(ones, total, 'arg2')
+    before = set(SharedArrays.shared_segments())
+    g.run('process', max_workers=2)
+    result = g.outputs()[total]
+    assert np.array_equal(result, np.full((1, 100000), 2.0))
+    assert not result.flags.writeable
+    assert len(set(SharedArrays.shared_segments()) - before) == 2
+    # invalidating the outputs releases their segments
+    del result
+    invalidate_downstream([g.nodes[ones]])
+    gc.collect()
+    assert set(SharedArrays.shared_segments()) == before
+
+
+def test_arrays_written_over_in_place_are_shared_again():
+    g = Graph()
+    ones = g.add_node(OnesNode())
+    g.set_parameter(ones, 'Length', 100000)
+    number = g.add_node(customNodes.NumberNode(1.0))
+    total = g.add_node(customNodes.AdditionNode())
+    g.connect(ones, total, 'arg1')
+    g.connect(number, total, 'arg2')
+    three = g.add_node(customNodes.NumberNode(3.0))
+    product = g.add_node(customNodes.MultiplicationNode())
+    g.connect(total, product, 'arg1')
+    g.connect(three, product, 'arg2')
+    g.run()
+    invalidate_downstream([g.nodes[product]])
+    g.run('process', max_workers=2)
+    assert np.array_equal(g.outputs()[product], np.full((1, 100000), 6.0))
+    # the sum is computed into its previous array here; the process run that
+    # follows must not send the copy that was made of it for the first one
+    address = g.nodes[total]._output_data_cache.ctypes.data
+    g.set_parameter(number, 'Number', 2.0)
+    g.run()
+    assert g.nodes[total]._output_data_cache.ctypes.data == address
+    invalidate_downstream([g.nodes[product]])
+    g.run('process', max_workers=2)
+    assert np.array_equal(g.outputs()[product], np.full((1, 100000), 9.0))
+
+
+def test_process_runs_exit_cleanly():
+    # in a fresh interpreter, to see what the resource tracker prints at exit. The
+    # first run shares an array made in this process, the second one an array
+    # made by a worker
+    code = """
+from pictograph import customNodes
+from pictograph.Graph import Graph
+from pictograph.Node import invalidate_downstream
+from pictograph.NumpyNodes import OnesNode
+g = Graph()
+ones = g.add_node(OnesNode())
+g.set_parameter(ones, 'Length', 100000)
+total = g.add_node(customNodes.AdditionNode())
+g.connect(ones, total, 'arg1')
+g.connect(ones, total, 'arg2')
+g.run()
+invalidate_downstream([g.nodes[total]])
+g.run('process', max_workers=2)
+invalidate_downstream([g.nodes[ones]])
+g.run('process', max_workers=2)
+print(g.outputs()[total].sum())
+"""
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(os.path.dirname(__file__), '..'),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.stdout.split() == ['200000.0']
+    assert result.stderr == ''
@@ -0,0 +1,98 @@
+import pytest
+
+from .context import pictograph
+from pictograph import Node, customNodes
+from pictograph.Cache import MemoCache
+from pictograph.Streaming import ArrayStream, chunks, collect, elementwise
+
+np = pytest.importorskip('numpy')
+from pictograph.NumpyNodes import (ChunkNode, CollectNode, NpyFileStreamNode, SaveNpyNode,
+                                   StreamSumNode, npVectorNode)
+
+
+class LargestBlockNode(customNodes.AdditionNode):
+    # remembers the biggest block it has seen
+    largest = 0
+
+    def _process_stream(self):
+        def check(a, b):
+            LargestBlockNode.largest = max(LargestBlockNode.largest, a.size)
+            return a + b
+        return elementwise(check, self.arg1, self.arg2)
+
+
+def test_elementwise_streams():
+    a = chunks(np.arange(10), 3)
+    b = chunks(np.ones(10), 3)
+    total = elementwise(lambda x, y: x * y + 1, a, b)
+    assert [len(block) for block in total] == [3, 3, 3, 1]
+    assert (collect(total) == np.arange(10) + 1).all()
+    # streams can be read more than once
+    assert (collect(total) == np.arange(10) + 1).all()
+
+
+def test_arithmetic_nodes_stream_blocks():
+    source = npVectorNode(np.arange(100.0))
+    chunk = ChunkNode()
+    chunk._adjustable_parameters["Chunk size"]._value = 10
+    add = LargestBlockNode()
+    sub = customNodes.SubtractionNode()
+    mul = customNodes.MultiplicationNode()
+    total = StreamSumNode()
+    chunk.connect_input("arg1", source)
+    add.connect_input("arg1", chunk)
+    add.connect_input("arg2", chunk)
+    sub.connect_input("arg1", add)
+    sub.connect_input("arg2", chunk)
+    mul.connect_input("arg1", sub)
+    mul.connect_input("arg2", chunk)
+    total.connect_input("arg1", mul)
+    LargestBlockNode.largest = 0
+    source.process()
+    assert isinstance(mul._output_data_cache, ArrayStream)
+    assert total._output_data_cache == (np.arange(100.0) ** 2).sum()
+    assert LargestBlockNode.largest == 10
+
+
+def test_non_streaming_nodes_get_whole_arrays():
+    source = npVectorNode(np.arange(10.0))
+    chunk = ChunkNode()
+    chunk._adjustable_parameters["Chunk size"]._value = 4
+    c = CollectNode()
+    chunk.connect_input("arg1", source)
+    c.connect_input("arg1", chunk)
+    source.process()
+    assert (c._output_data_cache == np.arange(10.0)).all()
+
+
+def test_file_to_file(tmp_path):
+    data = np.arange(30.0).reshape(10, 3)
+    np.save(str(tmp_path / 'in.npy'), data)
+    reader = NpyFileStreamNode()
+    reader._adjustable_parameters["Filename"]._value = str(tmp_path / 'in.npy')
+    reader._adjustable_parameters["Chunk size"]._value = 4
+    add = customNodes.AdditionNode()
+    writer = SaveNpyNode()
+    writer._adjustable_parameters["Filename"]._value = str(tmp_path / 'out.npy')
+    add.connect_input("arg1", reader)
+    add.connect_input("arg2", reader)
+    writer.connect_input("arg1", add)
+    reader.process()
+    assert (np.load(str(tmp_path / 'out.npy')) == 2 * data).all()
+
+
+def test_files_are_read_again(tmp_path):
+    filename = str(tmp_path / 'in.npy')
+    np.save(filename, np.arange(10.0))
+    reader = NpyFileStreamNode()
+    reader._adjustable_parameters["Filename"]._value = filename
+    c = CollectNode()
+    c.connect_input("arg1", reader)
+    Node.set_memo_cache(MemoCache(max_entries=10))
+    try:
+        reader.process()
+        np.save(filename, np.ones(10))
+        reader.process()
+    finally:
+        Node.set_memo_cache(None)
+    assert (c._output_data_cache == np.ones(10)).all()
@@ -0,0 +1,35 @@
+from .context import pictograph
+from .nodes import CountingAdditionNode
+from pictograph import customNodes
+from pictograph.Updates import ParameterUpdateQueue
+
+
+def test_only_the_last_value_is_evaluated():
+    n = customNodes.IntegerNode(0)
+    adder = CountingAdditionNode()
+    adder.connect_input('arg1', n)
+    adder.connect_input('arg2', n)
+    CountingAdditionNode.total = 0
+    queue = ParameterUpdateQueue()
+    for text in ['1', '10', '100', '1000', '10000', '100000', '1000000']:
+        queue.submit(n, 'Integer', int(text))
+    assert CountingAdditionNode.total == 0
+    assert queue.flush() == [n]
+    assert CountingAdditionNode.total == 1
+    assert adder._output_data_cache == 2000000
+    assert not queue.has_pending()
+
+
+def test_changes_to_several_nodes_evaluate_shared_descendants_once():
+    a = customNodes.NumberNode(1)
+    b = customNodes.NumberNode(2)
+    adder = CountingAdditionNode()
+    adder.connect_input('arg1', a)
+    adder.connect_input('arg2', b)
+    CountingAdditionNode.total = 0
+    queue = ParameterUpdateQueue()
+    queue.submit(a, 'Number', 10)
+    queue.submit(b, 'Number', 20)
+    queue.flush()
+    assert CountingAdditionNode.total == 1
+    assert adder._output_data_cache == 30
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from .context import pictograph
+from pictograph import customNodes
+from pictograph.Node import downstream_nodes
+
+pytest.importorskip('PyQt5')
+from PyQt5 import QtCore
+from pictograph.Worker import EvaluationWorker
+
+
+class GatedAdditionNode(customNodes.AdditionNode):
+    gate = threading.Event()
+
+    def _process_core(self):
+        GatedAdditionNode.gate.wait(5)
+        return super()._process_core()
+
+
+class CheckedAdditionNode(customNodes.AdditionNode):
+    def _process_core(self):
+        if self.arg1 < 0:
+            raise ValueError('negative')
+        return super()._process_core()
+
+
+def wait_until_idle(worker):
+    deadline = time.time() + 5
+    while worker.is_busy() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_worker_evaluates_downstream():
+    worker = EvaluationWorker()
+    try:
+        n = customNodes.NumberNode(2)
+        adder = customNodes.AdditionNode()
+        adder.connect_input('arg1', n)
+        adder.connect_input('arg2', n)
+        n._adjust_parameter('Number', 4, process=False)
+        worker.submit(downstream_nodes([n]))
+        wait_until_idle(worker)
+        assert adder._output_data_cache == 8
+    finally:
+        worker.stop()
+
+
+def test_failures_only_stop_their_own_branch():
+    worker = EvaluationWorker()
+    try:
+        n = customNodes.NumberNode(1)
+        checked = CheckedAdditionNode()
+        checked.connect_input('arg1', n)
+        checked.connect_input('arg2', n)
+        below = customNodes.AdditionNode()
+        below.connect_input('arg1', checked)
+        below.connect_input('arg2', checked)
+        other = customNodes.AdditionNode()
+        other.connect_input('arg1', n)
+        other.connect_input('arg2', n)
+        failures = []
+        worker.nodeFailed.connect(lambda node, message: failures.append(node), QtCore.Qt.DirectConnection)
+        worker.submit(downstream_nodes([n]))
+        wait_until_idle(worker)
+        assert below._output_data_cache == 4
+        n._adjust_parameter('Number', -1, process=False)
+        worker.submit(downstream_nodes([n]), [n])
+        wait_until_idle(worker)
+        assert failures == [checked]
+        assert not checked.is_output_valid() and not below.is_output_valid()
+        assert other._output_data_cache == -2
+    finally:
+        worker.stop()
+
+
+def test_cancelled_results_are_discarded():
+    worker = EvaluationWorker()
+    try:
+        GatedAdditionNode.gate.clear()
+        n = customNodes.NumberNode(2)
+        adder = GatedAdditionNode()
+        adder.connect_input('arg1', n)
+        adder.connect_input('arg2', n)
+        worker.submit(downstream_nodes([n]))
+        time.sleep(0.05)
+        worker.cancel()
+        n._adjust_parameter('Number', 10, process=False)
+        GatedAdditionNode.gate.set()
+        time.sleep(0.05)
+        assert not adder.is_output_valid()
+        worker.resume()
+        wait_until_idle(worker)
+        assert adder._output_data_cache == 20
+    finally:
+        worker.stop()
+
+
+def test_worker_evaluates_async_nodes():
+    from .test_async import fan
+    worker = EvaluationWorker()
+    try:
+        source, reads, total = fan()
+        failures = []
+        worker.nodeFailed.connect(lambda node, message: failures.append(message), QtCore.Qt.DirectConnection)
+        start = time.perf_counter()
+        worker.submit(downstream_nodes([source]))
+        wait_until_idle(worker)
+        assert time.perf_counter() - start < 0.6
+        assert total._output_data_cache == 20
+        source._adjust_parameter('Number', -1, process=False)
+        worker.submit(downstream_nodes([source]), [source])
+        wait_until_idle(worker)
+        assert not any(read.is_output_valid() for read in reads)
+        assert failures == ['negative reading'] * len(reads)
+        assert not total.is_output_valid()
+    finally:
+        worker.stop()